@@ -0,0 +1,103 @@
+import atexit
+import time
+from datetime import datetime
+from threading import Event, Lock, Thread
+from flask import current_app
+from sqlalchemy import and_, bindparam, or_
+from werkzeug.local import LocalProxy
+from app import db
+from app.models import User
+
+class ActivityTracker(object):
+    """Buffers users' last seen times and writes them in batches.
+
+    Requests only record the time in memory. The buffer is written with one
+    batched UPDATE when it holds `max_pending` users or `interval` seconds
+    have passed since the last write, and once more at shutdown. A thread,
+    started with the first request, writes it every `interval` seconds too,
+    so an idle worker doesn't sit on old times. A failed write puts the
+    times back in the buffer for the next one.
+    """
+    def __init__(self, app=None):
+        self._pending = {}
+        self._lock = Lock()
+        self._last_flush = time.monotonic()
+        self._stopped = Event()
+        self._thread = None
+        self.app = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.interval = app.config['LAST_SEEN_FLUSH_INTERVAL']
+        self.max_pending = app.config['LAST_SEEN_MAX_PENDING']
+        app.extensions['activity'] = self
+        atexit.register(self.shutdown)
+
+    def seen(self, user_id, when=None):
+        with self._lock:
+            self._pending[user_id] = when or datetime.utcnow()
+            due = len(self._pending) >= self.max_pending or \
+                time.monotonic() - self._last_flush >= self.interval
+            if self._thread is None:
+                self._thread = Thread(target=self._run, name='last-seen')
+                self._thread.daemon = True
+                self._thread.start()
+        if due:
+            self._try_flush()
+
+    def _try_flush(self):
+        # Last seen times aren't worth failing a page view or killing the
+        # thread over; they are kept for the next write
+        try:
+            self.flush()
+        except Exception:
+            self.app.logger.exception('Writing last seen times failed')
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            if self._pending and \
+                    time.monotonic() - self._last_flush >= self.interval:
+                with self.app.app_context():
+                    self._try_flush()
+
+    def last_seen(self, user_id):
+        """The buffered time for a user not yet written, if any."""
+        return self._pending.get(user_id)
+
+    def flush(self):
+        """Write every buffered time in one UPDATE; returns how many."""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._last_flush = time.monotonic()
+        if not pending:
+            return 0
+        users = User.__table__
+        # Other workers buffer too, so never move a time backwards
+        statement = users.update()\
+            .where(and_(
+                users.c.id == bindparam('b_id'),
+                or_(users.c.last_seen.is_(None),
+                    users.c.last_seen < bindparam('b_seen'))))\
+            .values(last_seen=bindparam('b_seen'))
+        try:
+            with db.engine.begin() as conn:
+                conn.execute(statement, [{'b_id': user_id, 'b_seen': seen}
+                                         for user_id, seen in pending.items()])
+        except Exception:
+            with self._lock:
+                for user_id, seen in pending.items():
+                    newer = self._pending.get(user_id)
+                    if newer is None or newer < seen:
+                        self._pending[user_id] = seen
+            raise
+        return len(pending)
+
+    def shutdown(self):
+        self._stopped.set()
+        if self._pending:
+            with self.app.app_context():
+                self._try_flush()
+
+activity = LocalProxy(lambda: current_app.extensions['activity'])
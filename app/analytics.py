@@ -0,0 +1,109 @@
+from collections import defaultdict
+from sqlalchemy import and_, bindparam, desc, func, select
+from app import db
+from app.models import User, Holding, Stock, Transaction, StockRollup, StockVolume
+from app.models import DataVersion
+
+def _add(table, keys, rows):
+    """Add each row's counts onto the rollup row with the same keys.
+
+    Rows that don't exist yet are inserted. Two requests inserting the same
+    row at once raise IntegrityError, which with_retries() retries.
+    """
+    if not rows:
+        return
+    counts = [c for c in rows[0] if c not in keys]
+    existing = set(tuple(r) for r in db.session.execute(
+        select([table.c[k] for k in keys]).where(and_(*[
+            table.c[k].in_(set(row[k] for row in rows)) for k in keys]))))
+    updates, inserts = [], []
+    for row in rows:
+        if tuple(row[k] for k in keys) in existing:
+            updates.append(dict(('b_' + c, v) for c, v in row.items()))
+        else:
+            inserts.append(row)
+    if updates:
+        db.session.execute(table.update()
+            .where(and_(*[table.c[k] == bindparam('b_' + k) for k in keys]))
+            .values(dict((c, table.c[c] + bindparam('b_' + c)) for c in counts)),
+            updates)
+    if inserts:
+        db.session.execute(table.insert(), inserts)
+
+def record_trades(transactions, cost_changes):
+    """Fold a batch of trades into the rollups, in the caller's transaction.
+
+    `transactions` are the Transaction rows the batch inserted and
+    `cost_changes` maps each stock to the change in its total cost basis.
+    """
+    rollups = defaultdict(lambda: {'shares': 0, 'market_value': 0.0})
+    volumes = defaultdict(lambda: {'trades': 0, 'shares': 0, 'notional': 0.0})
+    for t in transactions:
+        shares = t['shares'] if t['buy_or_sell'] == 'buy' else -t['shares']
+        # Trades fill at the current price, so this is the change in the
+        # stock's market value too
+        rollups[t['team']]['shares'] += shares
+        rollups[t['team']]['market_value'] += shares * t['price']
+        volume = volumes[(t['timestamp'].date(), t['team'])]
+        volume['trades'] += 1
+        volume['shares'] += t['shares']
+        volume['notional'] += t['shares'] * t['price']
+    _add(StockRollup.__table__, ['stock'], [
+        dict(r, stock=stock, cost_basis=cost_changes.get(stock, 0.0))
+        for stock, r in rollups.items()])
+    _add(StockVolume.__table__, ['date', 'stock'], [
+        dict(v, date=day, stock=stock) for (day, stock), v in volumes.items()])
+
+def rebuild(batch_size=10000):
+    """Recompute every rollup from the holdings and the trade ledger."""
+    StockRollup.query.delete()
+    StockVolume.query.delete()
+    holdings = db.session.query(
+            Stock.name, Stock.price,
+            func.coalesce(func.sum(Holding.shares), 0),
+            func.coalesce(func.sum(Holding.shares * Holding.purchase_price), 0))\
+        .outerjoin(Holding, Holding.stock == Stock.name)\
+        .group_by(Stock.name, Stock.price)
+    rollups = [{'stock': name, 'shares': shares, 'cost_basis': cost_basis,
+                'market_value': shares * (price or 0)}
+               for name, price, shares, cost_basis in holdings]
+    # Dates are bucketed here rather than in SQL, which has no portable
+    # date() function
+    volumes = defaultdict(lambda: {'trades': 0, 'shares': 0, 'notional': 0.0})
+    trades = db.session.query(Transaction.timestamp, Transaction.team,
+                              Transaction.shares, Transaction.price)\
+        .yield_per(batch_size)
+    for timestamp, team, shares, price in trades:
+        volume = volumes[(timestamp.date(), team)]
+        volume['trades'] += 1
+        volume['shares'] += shares
+        volume['notional'] += shares * price
+    if rollups:
+        db.session.execute(StockRollup.__table__.insert(), rollups)
+    if volumes:
+        db.session.execute(StockVolume.__table__.insert(), [
+            dict(v, date=day, stock=stock) for (day, stock), v in volumes.items()])
+    DataVersion.bump('trades')
+    db.session.commit()
+    return len(rollups), len(volumes)
+
+def top_stocks(column, n=10):
+    """The rollups with the largest `column`, skipping stocks nobody holds."""
+    return StockRollup.query.filter(StockRollup.shares > 0)\
+        .order_by(desc(column)).limit(n).all()
+
+def most_traded(n=10):
+    """The most traded stocks by dollar volume on the latest trading day."""
+    latest = db.session.query(func.max(StockVolume.date)).scalar()
+    if latest is None:
+        return None, []
+    volumes = StockVolume.query.filter(StockVolume.date == latest)\
+        .order_by(desc(StockVolume.notional)).limit(n).all()
+    return latest, volumes
+
+def recent_transactions(n=10):
+    """The latest trades with the trader's username, in one query."""
+    return db.session.query(Transaction, User.username)\
+        .join(User, Transaction.user_id == User.id)\
+        .order_by(desc(Transaction.timestamp))\
+        .limit(n).all()
@@ -0,0 +1,113 @@
+from datetime import datetime
+from flask import request, abort, jsonify, current_app
+from flask_login import current_user, login_required
+from app import db
+from app.api import bp
+from app.database import read_only
+from app.caching import conditional
+from app.catalog import catalog
+from app.charts import price_series_json
+from app.events import broadcaster
+from app.leaderboard import leaderboard
+from app.trading import execute_orders, market_is_open, TradeError
+from app.models import User, Stock, LimitOrder
+
+@bp.route('/orders', methods=['POST'])
+@login_required
+def orders():
+    data = request.get_json(silent=True) or {}
+    orders = data.get('orders')
+    if not isinstance(orders, list) or not orders:
+        return jsonify(error='Send a list of orders.'), 400
+    if len(orders) > current_app.config['MAX_BATCH_ORDERS']:
+        return jsonify(error='Send at most {} orders at a time.'.format(
+            current_app.config['MAX_BATCH_ORDERS'])), 400
+    if not market_is_open():
+        return jsonify(error='The market is closed. Come back after 8 a.m. EST tomorrow.'), 403
+    try:
+        parsed = [(o['team'], o['shares'], o['buy_or_sell']) for o in orders]
+    except (KeyError, TypeError):
+        return jsonify(error='Each order needs a team, shares and buy_or_sell.'), 400
+    if not all(isinstance(team, str) for team, _, _ in parsed):
+        return jsonify(error='Teams must be given by name.'), 400
+    try:
+        results = execute_orders(current_user.id, parsed)
+    except TradeError as e:
+        return jsonify(error=str(e)), 503
+    if any(r.ok for r in results):
+        leaderboard.update_users([current_user.id])
+        broadcaster.poke()
+    cash = db.session.query(User.cash).filter(User.id == current_user.id).scalar()
+    return jsonify(cash=cash, results=[r._asdict() for r in results])
+
+@bp.route('/limit_orders', methods=['GET'])
+@login_required
+@read_only
+def limit_orders():
+    orders = LimitOrder.query\
+        .filter_by(user_id=current_user.id, status='open')\
+        .order_by(LimitOrder.timestamp)
+    return jsonify(orders=[o.to_dict() for o in orders])
+
+@bp.route('/limit_orders', methods=['POST'])
+@login_required
+def place_limit_order():
+    data = request.get_json(silent=True) or {}
+    team = data.get('team')
+    shares = data.get('shares')
+    limit_price = data.get('limit_price')
+    buy_or_sell = data.get('buy_or_sell')
+    if not isinstance(team, str) or Stock.query.get(team) is None:
+        return jsonify(error='That team is not on the exchange.'), 400
+    if not isinstance(shares, int) or isinstance(shares, bool) or shares <= 0:
+        return jsonify(error='You must trade at least one share.'), 400
+    if not isinstance(limit_price, (int, float)) or isinstance(limit_price, bool) \
+            or limit_price <= 0:
+        return jsonify(error='The limit price must be above zero.'), 400
+    if buy_or_sell not in ('buy', 'sell'):
+        return jsonify(error='Trades must be a buy or a sell.'), 400
+    order = LimitOrder(
+        user_id=current_user.id,
+        team=team,
+        shares=shares,
+        limit_price=round(limit_price, 2),
+        buy_or_sell=buy_or_sell,
+        status='open',
+        timestamp=datetime.utcnow()
+    )
+    db.session.add(order)
+    db.session.commit()
+    return jsonify(order.to_dict()), 201
+
+@bp.route('/limit_orders/<int:id>', methods=['DELETE'])
+@login_required
+def cancel_limit_order(id):
+    cancelled = LimitOrder.query\
+        .filter_by(id=id, user_id=current_user.id, status='open')\
+        .update({'status': 'cancelled'}, synchronize_session=False)
+    db.session.commit()
+    if not cancelled:
+        abort(404)
+    return jsonify(LimitOrder.query.get(id).to_dict())
+
+@bp.route('/prices', methods=['GET'])
+@login_required
+@read_only
+@conditional('prices')
+def prices():
+    # ?teams=A,B,C (or repeated) picks the teams, every team by default;
+    # ?from= and ?to= bound the dates (YYYY-MM-DD, inclusive)
+    names = [n for value in request.args.getlist('teams')
+             for n in value.split(',') if n] or None
+    if names is not None:
+        stocks = catalog.refresh()
+        unknown = [n for n in names if stocks.get(n) is None]
+        if unknown:
+            return jsonify(error='Not on the exchange: {}'.format(', '.join(unknown))), 400
+    try:
+        start, end = [datetime.strptime(request.args[arg], '%Y-%m-%d').date()
+                      if request.args.get(arg) else None for arg in ('from', 'to')]
+    except ValueError:
+        return jsonify(error='Dates must be YYYY-MM-DD.'), 400
+    return current_app.response_class(price_series_json(names, start, end),
+                                      mimetype='application/json')
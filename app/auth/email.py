@@ -0,0 +1,20 @@
+from flask import render_template, current_app
+from app.email import send_email
+
+def send_password_reset_email(user):
+    token = user.get_reset_password_token()
+    send_email(
+        'Mid-Major Madness Stock Exchange Password Reset Request',
+        sender=current_app.config['ADMINS'][0],
+        recipients=[user.email],
+        text_body=render_template(
+            'email/reset_password.txt',
+            user=user,
+            token=token
+        ),
+        html_body=render_template(
+            'email/reset_password.html',
+            user=user,
+            token=token
+        )
+    )
@@ -0,0 +1,77 @@
+from collections import namedtuple
+import numpy as np
+from app import db
+from app.models import User
+from app.replay import replay
+
+# Prices are AdjEM + |min AdjEM| + 0.1, so price - 0.1 is how far a team's
+# AdjEM is above the worst team's. Alternative formulas are written over
+# that margin and applied to every trade and snapshot price.
+def _margin(formula):
+    def reprice(prices):
+        return np.round(formula(np.maximum(prices - 0.1, 0)), 2)
+    return reprice
+
+PRICING = {
+    'kenpom': None,
+    'floor1': _margin(lambda m: m + 1.0),
+    'squared': _margin(lambda m: m ** 2 / 20 + 0.1),
+    'sqrt': _margin(lambda m: 5 * np.sqrt(m) + 0.1),
+}
+
+Result = namedtuple('Result',
+    ['rank', 'user_id', 'username', 'equity', 'cash', 'realized', 'unrealized'])
+
+class Backtest(object):
+    """One pass of the trade ledger, keeping what was asked for.
+
+    Replays every trade up to `until` (default: the last price date) with
+    the prices `reprice` makes, and keeps the final day's state plus daily
+    equity curves for the `track`ed user ids. `each_day`, if given, is
+    called with every DailyState on the way.
+    """
+    def __init__(self, until=None, reprice=None, track=(), each_day=None):
+        self.until = until
+        self.reprice = reprice
+        self.track = list(track)
+        self.each_day = each_day
+        self.state = None
+        self.curves = dict((user_id, []) for user_id in self.track)
+
+    def run(self):
+        positions = None
+        for state in replay(reprice=self.reprice):
+            if self.until is not None and state.date > self.until:
+                break
+            if positions is None:
+                index = dict((u, i) for i, u in enumerate(state.user_ids.tolist()))
+                positions = [(u, index[u]) for u in self.track if u in index]
+            equity = state.cash + state.holdings_value
+            for user_id, i in positions:
+                self.curves[user_id].append((state.date, round(float(equity[i]), 2)))
+            if self.each_day is not None:
+                self.each_day(state)
+            self.state = state
+        return self
+
+    def results(self, n=None):
+        """Active users at the final date, ranked by equity."""
+        state = self.state
+        if state is None:
+            return []
+        equity = state.cash + state.holdings_value
+        unrealized = state.holdings_value - state.cost_basis
+        active = np.flatnonzero(state.active)
+        ranked = active[np.argsort(-equity[active], kind='stable')][:n]
+        user_ids = state.user_ids[ranked].tolist()
+        usernames = db.session.query(User.id, User.username)
+        if n is not None:
+            usernames = usernames.filter(User.id.in_(user_ids))
+        usernames = dict(usernames)
+        columns = [a[ranked].round(2).tolist()
+                   for a in (equity, state.cash, state.realized, unrealized)]
+        return [
+            Result(rank + 1, user_id, usernames.get(user_id), *values)
+            for rank, (user_id, values) in enumerate(
+                zip(user_ids, zip(*columns)))
+        ]
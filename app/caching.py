@@ -0,0 +1,118 @@
+from functools import wraps
+from hashlib import md5
+from flask import current_app, g, request, session, make_response
+from flask_login import current_user
+from jinja2 import nodes
+from jinja2.ext import Extension
+from sqlalchemy import select
+from app import db
+from app.charts import LRUCache
+from app.models import DataVersion
+
+class Deferred(object):
+    """A value computed the first time a template uses it.
+
+    Views hand query results to templates this way, so a fragment served
+    from the cache never runs its queries.
+    """
+    def __init__(self, fn, *args):
+        self.fn = fn
+        self.args = args
+        self._done = False
+        self._value = None
+
+    @property
+    def value(self):
+        if not self._done:
+            self._value = self.fn(*self.args)
+            self._done = True
+        return self._value
+
+    def __iter__(self):
+        return iter(self.value)
+
+class FragmentCache(Extension):
+    """{% cache name, key %}...{% endcache %} renders its body once per key.
+
+    Fragments are kept in the environment's fragment_cache, an LRU cache
+    per app and process; key them on the data versions they show, e.g.
+    g.data_versions set by @conditional.
+    """
+    tags = set(['cache'])
+
+    def __init__(self, environment):
+        super(FragmentCache, self).__init__(environment)
+        environment.extend(fragment_cache=None)
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        args = [parser.parse_expression()]
+        parser.stream.expect('comma')
+        args.append(parser.parse_expression())
+        body = parser.parse_statements(['name:endcache'], drop_needle=True)
+        return nodes.CallBlock(self.call_method('_render', args), [], [], body)\
+            .set_lineno(lineno)
+
+    def _render(self, name, key, caller):
+        cache = self.environment.fragment_cache
+        html = cache.get((name, key))
+        if html is None:
+            html = caller()
+            cache.set((name, key), html)
+        return html
+
+def init_app(app):
+    app.jinja_env.add_extension(FragmentCache)
+    app.jinja_env.fragment_cache = LRUCache(app.config['FRAGMENT_CACHE_SIZE'])
+
+def data_versions(names):
+    """{name: (version, updated_at)} for the named counters, in one query."""
+    table = DataVersion.__table__
+    rows = db.session.execute(
+        select([table.c.name, table.c.version, table.c.updated_at])
+        .where(table.c.name.in_(names)))
+    return dict((name, (version, updated_at)) for name, version, updated_at in rows)
+
+def conditional(*names):
+    """Tag a view's pages with an ETag and Last-Modified from data versions.
+
+    `names` are DataVersion counters, formatted with the view's arguments
+    (so 'price:{teamname}' follows the URL). A request whose If-None-Match,
+    or failing that If-Modified-Since, is still current gets a 304 before
+    the view runs. The versions are left in g.data_versions for fragment
+    cache keys.
+    """
+    def decorator(view):
+        @wraps(view)
+        def decorated(*args, **kwargs):
+            keys = [name.format(**kwargs) for name in names]
+            versions = data_versions(keys)
+            g.data_versions = tuple(versions.get(key, (0, None))[0] for key in keys)
+            stamps = [updated_at for _, updated_at in versions.values() if updated_at]
+            last_modified = max(stamps).replace(microsecond=0) if stamps else None
+            # Pages show who is logged in, so each user gets their own tag
+            etag = md5(repr((request.full_path, current_user.get_id(),
+                             g.data_versions)).encode()).hexdigest()
+            # A pending flash message has to be rendered
+            if '_flashes' not in session:
+                if request.if_none_match:
+                    fresh = request.if_none_match.contains_weak(etag)
+                else:
+                    since = request.if_modified_since
+                    fresh = since is not None and last_modified is not None and \
+                        last_modified <= since.replace(tzinfo=None)
+                if fresh:
+                    response = current_app.response_class(status=304)
+                    return _tag(response, etag, last_modified)
+            return _tag(make_response(view(*args, **kwargs)), etag, last_modified)
+        return decorated
+    return decorator
+
+def _tag(response, etag, last_modified):
+    response.set_etag(etag, weak=True)
+    if last_modified is not None:
+        response.last_modified = last_modified
+    # Per-user pages that browsers must revalidate before reuse
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
@@ -0,0 +1,53 @@
+from collections import namedtuple
+from threading import Lock
+from flask import current_app
+from werkzeug.local import LocalProxy
+from app import db
+from app.models import Stock, DataVersion
+
+class StockEntry(namedtuple('StockEntry', ['name', 'price'])):
+    __slots__ = ()
+
+    def __str__(self):
+        return "{}: ${:.2f}".format(self.name, self.price)
+
+class StockCatalog(object):
+    """Every stock by name, plus the sorted list for select fields.
+
+    Loaded once per app and process and reloaded only when the 'prices' data
+    version that update_stocks.py bumps has moved, so gunicorn workers stay
+    in step with one primary key lookup instead of re-reading the table.
+    """
+    def __init__(self, app=None):
+        self.version = None
+        self._by_name = {}
+        self._sorted = []
+        self._lock = Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.extensions['catalog'] = self
+
+    def refresh(self):
+        version = DataVersion.get('prices')
+        with self._lock:
+            if version != self.version:
+                entries = [StockEntry(name, price) for name, price in
+                           db.session.query(Stock.name, Stock.price).order_by(Stock.name)]
+                self._by_name = dict((e.name, e) for e in entries)
+                self._sorted = entries
+                self.version = version
+        return self
+
+    def get(self, name):
+        return self._by_name.get(name)
+
+    def all(self):
+        return self._sorted
+
+    def invalidate(self):
+        with self._lock:
+            self.version = None
+
+catalog = LocalProxy(lambda: current_app.extensions['catalog'])
@@ -0,0 +1,133 @@
+import json
+from collections import OrderedDict, namedtuple
+from threading import Lock
+from flask import current_app
+from werkzeug.local import LocalProxy
+from app import db
+from app.models import DataVersion
+from app.prices import price_series, price_table
+
+TeamChart = namedtuple('TeamChart', ['title', 'svg', 'max_price', 'min_price'])
+
+class LRUCache(object):
+    """A bounded mapping that evicts the least recently used entry."""
+    def __init__(self, maxsize=128):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key):
+        with self._lock:
+            try:
+                self._data.move_to_end(key)
+            except KeyError:
+                return None
+            return self._data[key]
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+class ChartCache(LRUCache):
+    """Rendered team charts and price series, all for the same 'prices' version."""
+    def __init__(self, maxsize=128):
+        super(ChartCache, self).__init__(maxsize)
+        self.version = None
+
+def init_app(app):
+    app.extensions['chart_cache'] = ChartCache(app.config['CHART_CACHE_SIZE'])
+
+chart_cache = LocalProxy(lambda: current_app.extensions['chart_cache'])
+
+def render_team_chart(teamname, prices):
+    """Draw the price history chart and find the max and min in one pass."""
+    # pygal is slow to import and only needed once a chart is drawn
+    import pygal
+    title = 'Stock Price History for {}\n from {} to {}'\
+        .format(teamname, prices[0].date.strftime("%b. %d"), prices[-1].date.strftime("%b. %d"))
+    x_labels = []
+    price_points = []
+    max_price = min_price = prices[0].price
+    for p in prices:
+        price_points.append(p.price)
+        max_price = max(max_price, p.price)
+        min_price = min(min_price, p.price)
+        if p.date.weekday() == 0:
+            x_labels.append(p.date)
+        else:
+            x_labels.append("")
+
+    line_chart = pygal.Line(
+                        width=600, height=300,
+                        explicit_size=True, title=title,
+                        x_label_rotation=20,
+                        range=(0, max_price + 2),
+                        disable_xml_declaration=True,
+                        show_legend=False
+                  )
+    line_chart.x_labels = x_labels
+    line_chart.add('Price', price_points)
+    return TeamChart(title, line_chart.render(), max_price, min_price)
+
+def _versions(*names):
+    """The 'prices' data version and any others named, in one query.
+
+    Empties the cache once 'prices' has moved on. The versions are read
+    before the prices, so a load landing in between leaves newer data under
+    an older key, never the other way round.
+    """
+    names = ('prices',) + names
+    rows = dict(db.session.query(DataVersion.name, DataVersion.version)
+                .filter(DataVersion.name.in_(names)))
+    versions = [rows.get(name) or 0 for name in names]
+    if versions[0] != chart_cache.version:
+        # Every load bumps 'prices', so each cached chart may be stale
+        chart_cache.clear()
+        chart_cache.version = versions[0]
+    return versions
+
+def team_chart(teamname):
+    """The team's chart, cached until its 'price:<team>' version moves.
+
+    Resumed loads can add prices without moving the latest date, so the
+    version, not the date, says whether a chart is current.
+    """
+    _, version = _versions('price:' + teamname)
+    key = (teamname, version)
+    chart = chart_cache.get(key)
+    if chart is None:
+        prices = price_series(teamname)
+        if not prices:
+            return None
+        chart = render_team_chart(teamname, prices)
+        chart_cache.set(key, chart)
+    return chart
+
+def price_series_json(names=None, start=None, end=None):
+    """Price series for comparing teams, as compact JSON.
+
+    {"dates": [...], "prices": {team: [...]}}: one shared date axis and a
+    list of prices per team, null on dates it has no price. Cached until
+    the 'prices' version moves, as the ETag of /api/prices does.
+    """
+    version, = _versions()
+    if names is not None:
+        names = tuple(sorted(set(names)))
+    key = ('series', names, start, end, version)
+    body = chart_cache.get(key)
+    if body is None:
+        table = price_table(names, start, end)
+        body = json.dumps({'dates': [d.isoformat() for d in table.dates],
+                           'prices': table.prices}, separators=(',', ':'))
+        chart_cache.set(key, body)
+    return body
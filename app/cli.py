@@ -0,0 +1,101 @@
+from datetime import datetime
+import click
+
+def _date(value):
+    if value:
+        return datetime.strptime(value, '%Y-%m-%d').date()
+
+def register(app):
+    @app.cli.group()
+    def snapshots():
+        """Portfolio snapshot commands."""
+        pass
+
+    @snapshots.command()
+    @click.option('--start', help='First date to rebuild (YYYY-MM-DD).')
+    @click.option('--end', help='Last date to rebuild (YYYY-MM-DD).')
+    def backfill(start, end):
+        """Rebuild snapshots from the trade ledger and price history."""
+        from app.snapshots import backfill
+        days, written = backfill(_date(start), _date(end))
+        click.echo('Wrote {} snapshots over {} days.'.format(written, days))
+
+    @app.cli.group()
+    def analytics():
+        """Analytics rollup commands."""
+        pass
+
+    @analytics.command()
+    def rebuild():
+        """Recompute the analytics rollups from holdings and trades."""
+        from app.analytics import rebuild
+        stocks, volumes = rebuild()
+        click.echo('Rebuilt {} stock rollups and {} daily volumes.'.format(stocks, volumes))
+
+    @app.cli.group()
+    def email():
+        """Email commands."""
+        pass
+
+    @email.command()
+    @click.argument('subject')
+    @click.argument('body', type=click.File())
+    def announce(subject, body):
+        """Email an announcement to every user, with BODY as the text."""
+        from app.email import mail_queue, send_announcement
+        from app.models import User
+        queued, dropped = send_announcement(User.query.filter(User.email.isnot(None)),
+                                            subject, body.read())
+        mail_queue.join()
+        metrics = mail_queue.metrics()
+        click.echo('Queued {} messages, dropped {}: {} sent, {} failed.'.format(
+            queued, dropped, metrics.get('sent', 0), metrics.get('failed', 0)))
+
+    @app.cli.command()
+    @click.option('--date', help='Stop the replay after this date (YYYY-MM-DD).')
+    @click.option('--user', 'usernames', multiple=True,
+                  help='Show this user\'s daily equity curve; may be repeated.')
+    @click.option('--pricing', default='kenpom', show_default=True,
+                  type=click.Choice(['kenpom', 'floor1', 'squared', 'sqrt']),
+                  help='Pricing formula to replay the season with.')
+    @click.option('--top', default=10, show_default=True, help='Users to rank.')
+    @click.option('--output', type=click.File('w'),
+                  help='Write every user\'s daily equity and P&L to this CSV.')
+    def backtest(date, usernames, pricing, top, output):
+        """Replay every trade to show P&L by user, optionally repriced."""
+        import csv
+        import numpy as np
+        from app.backtest import PRICING, Backtest
+        from app.models import User
+        users = User.query.filter(User.username.in_(usernames)).all() if usernames else []
+        missing = set(usernames) - set(u.username for u in users)
+        if missing:
+            raise click.UsageError('No such user: {}'.format(', '.join(sorted(missing))))
+        if output:
+            writer = csv.writer(output)
+            writer.writerow(['date', 'user_id', 'equity', 'cash', 'realized', 'unrealized'])
+            def each_day(state):
+                active = np.flatnonzero(state.active)
+                writer.writerows(zip(
+                    [state.date] * len(active),
+                    state.user_ids[active].tolist(),
+                    (state.cash + state.holdings_value)[active].round(2).tolist(),
+                    state.cash[active].round(2).tolist(),
+                    state.realized[active].round(2).tolist(),
+                    (state.holdings_value - state.cost_basis)[active].round(2).tolist()))
+        else:
+            each_day = None
+        run = Backtest(_date(date), PRICING[pricing], [u.id for u in users], each_day).run()
+        if run.state is None:
+            click.echo('No price history to replay.')
+            return
+        click.echo('Standings on {} with {} pricing:'.format(run.state.date, pricing))
+        click.echo('{:>4} {:<20} {:>10} {:>10} {:>10} {:>10}'.format(
+            'rank', 'user', 'equity', 'cash', 'realized', 'unrealized'))
+        for r in run.results(top):
+            click.echo('{:>4} {:<20} {:>10.2f} {:>10.2f} {:>10.2f} {:>10.2f}'.format(
+                r.rank, r.username, r.equity, r.cash, r.realized, r.unrealized))
+        for user in users:
+            click.echo('\nEquity curve for {}:'.format(user.username))
+            for day, equity in run.curves[user.id]:
+                click.echo('{} {:>10.2f}'.format(day, equity))
@@ -0,0 +1,109 @@
+from functools import wraps
+from threading import Lock
+from flask import g, has_request_context
+import flask_sqlalchemy
+from sqlalchemy import event, orm
+from sqlalchemy.pool import QueuePool
+from sqlalchemy.sql.expression import Select, CompoundSelect
+
+POOL_OPTIONS = ('pool_size', 'max_overflow', 'pool_timeout', 'pool_recycle')
+
+def _in_memory(url):
+    return url.drivername.startswith('sqlite') and \
+        url.database in (None, '', ':memory:')
+
+def read_only(view):
+    """Run a view's SELECTs on the read-only engine (the 'read' bind)."""
+    @wraps(view)
+    def decorated(*args, **kwargs):
+        g.read_only = True
+        return view(*args, **kwargs)
+    return decorated
+
+class RoutingSession(flask_sqlalchemy.SignallingSession):
+    """Sends SELECTs made by read_only views to the read engine.
+
+    Flushes and every other statement go to the primary engine as usual.
+    """
+    def get_bind(self, mapper=None, clause=None):
+        if has_request_context() and g.get('read_only') and not self._flushing \
+                and isinstance(clause, (Select, CompoundSelect)):
+            engine = flask_sqlalchemy.get_state(self.app).db.read_engine(self.app)
+            if engine is not None:
+                return engine
+        return super(RoutingSession, self).get_bind(mapper, clause)
+
+class SQLAlchemy(flask_sqlalchemy.SQLAlchemy):
+    """Flask-SQLAlchemy with connection tuning and a read-only engine.
+
+    SQLite connections get the journal mode (WAL by default), busy timeout,
+    synchronous and cache size pragmas from the config as they are opened,
+    and are pooled like any other database. The 'read' bind, which defaults
+    to the main database, is opened read-only: query_only on SQLite, read
+    only transactions on Postgres.
+    """
+    def __init__(self, *args, **kwargs):
+        self._configured = set()
+        self._configure_lock = Lock()
+        super(SQLAlchemy, self).__init__(*args, **kwargs)
+
+    def create_session(self, options):
+        return orm.sessionmaker(class_=RoutingSession, db=self, **options)
+
+    def apply_driver_hacks(self, app, sa_url, options):
+        in_memory = _in_memory(sa_url)
+        rv = super(SQLAlchemy, self).apply_driver_hacks(app, sa_url, options)
+        if sa_url.drivername.startswith('sqlite'):
+            if in_memory or not options.get('pool_size'):
+                # One shared connection, or a new one per checkout: there is
+                # no pool to size
+                for option in POOL_OPTIONS:
+                    options.pop(option, None)
+            else:
+                # SQLAlchemy doesn't pool SQLite files unless told to, and
+                # pooled connections move between threads
+                options['poolclass'] = QueuePool
+                options.setdefault('connect_args', {})['check_same_thread'] = False
+        else:
+            options.setdefault('pool_pre_ping', True)
+        return rv
+
+    def get_engine(self, app=None, bind=None):
+        app = self.get_app(app)
+        engine = super(SQLAlchemy, self).get_engine(app, bind)
+        if engine not in self._configured:
+            with self._configure_lock:
+                if engine not in self._configured:
+                    event.listen(engine, 'connect',
+                                 self._on_connect(app.config, bind == 'read'))
+                    self._configured.add(engine)
+        return engine
+
+    def read_engine(self, app=None):
+        """The read-only engine, or None if reads must share the primary's."""
+        app = self.get_app(app)
+        if 'read' not in (app.config.get('SQLALCHEMY_BINDS') or {}):
+            return None
+        engine = self.get_engine(app, 'read')
+        # A second in-memory engine would be a different, empty database
+        if _in_memory(engine.url):
+            return None
+        return engine
+
+    def _on_connect(self, config, read_only):
+        def on_connect(dbapi_connection, connection_record):
+            module = type(dbapi_connection).__module__
+            cursor = dbapi_connection.cursor()
+            if module.startswith('sqlite3'):
+                cursor.execute('PRAGMA busy_timeout={:d}'.format(config['SQLITE_BUSY_TIMEOUT']))
+                cursor.execute('PRAGMA journal_mode={}'.format(config['SQLITE_JOURNAL_MODE']))
+                cursor.execute('PRAGMA synchronous={}'.format(config['SQLITE_SYNCHRONOUS']))
+                # Negative sizes are in KiB rather than pages
+                cursor.execute('PRAGMA cache_size=-{:d}'.format(config['SQLITE_CACHE_SIZE']))
+                if read_only:
+                    cursor.execute('PRAGMA query_only=ON')
+            elif read_only and module.startswith('psycopg2'):
+                cursor.execute('SET SESSION CHARACTERISTICS AS TRANSACTION READ ONLY')
+                dbapi_connection.commit()
+            cursor.close()
+        return on_connect
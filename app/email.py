@@ -1,33 +1,179 @@
-from threading import Thread
-from flask import render_template
+import atexit
+import smtplib
+import time
+from collections import Counter
+from queue import Queue, Empty, Full
+from threading import Lock, Thread
+from flask import current_app
 from flask_mail import Message
-from app import app, mail
+from werkzeug.local import LocalProxy
+from app import mail
 
+class MailQueue(object):
+    """A fixed pool of worker threads sending messages from a bounded queue.
 
-def send_async_email(app, msg):
-    with app.app_context():
-        mail.send(msg)
+    A worker takes up to `batch_size` waiting messages and sends them over
+    one SMTP connection. A message that hits an SMTP or network error is
+    retried on a new connection with exponential backoff, and dropped and
+    logged after `retries` tries. Any other error drops and logs just the
+    message that raised it.
+    Workers start with the first message, so importing the app for a CLI
+    command doesn't start any.
+    """
+    def __init__(self, app=None):
+        self._counts = Counter()
+        self._lock = Lock()
+        self._workers = []
+        self._busy = 0
+        self.app = None
+        if app is not None:
+            self.init_app(app)
 
-def send_email(subject, sender, recipients, text_body, html_body):
+    def init_app(self, app):
+        self.app = app
+        self.workers = app.config['MAIL_WORKERS']
+        self.batch_size = app.config['MAIL_BATCH_SIZE']
+        self.retries = app.config['MAIL_RETRIES']
+        self.backoff = app.config['MAIL_RETRY_BACKOFF']
+        self.queue = Queue(app.config['MAIL_QUEUE_SIZE'])
+        app.extensions['mail_queue'] = self
+        atexit.register(self.shutdown)
+
+    def _count(self, name, n=1):
+        with self._lock:
+            self._counts[name] += n
+
+    def _start(self):
+        with self._lock:
+            if self._workers:
+                return
+            for i in range(self.workers):
+                worker = Thread(target=self._work, name='mail-{}'.format(i))
+                worker.daemon = True
+                worker.start()
+                self._workers.append(worker)
+
+    def put(self, msg, timeout=1):
+        """Queue a message; returns False if the queue stayed full."""
+        self._start()
+        try:
+            self.queue.put(msg, timeout=timeout)
+        except Full:
+            self._count('dropped')
+            self.app.logger.error('Mail queue full, dropped: %s', msg.subject)
+            return False
+        self._count('queued')
+        return True
+
+    def join(self):
+        """Wait until every queued message has been sent or given up on."""
+        self.queue.join()
+
+    def metrics(self):
+        with self._lock:
+            metrics = dict(self._counts)
+            metrics['busy_workers'] = self._busy
+        metrics['queue_depth'] = self.queue.qsize()
+        metrics['workers'] = len(self._workers)
+        return metrics
+
+    def _work(self):
+        stop = False
+        while not stop:
+            msg = self.queue.get()
+            if msg is None:
+                self.queue.task_done()
+                return
+            batch = [msg]
+            while len(batch) < self.batch_size:
+                try:
+                    msg = self.queue.get_nowait()
+                except Empty:
+                    break
+                if msg is None:
+                    # Shutting down: send what's in hand, then stop
+                    self.queue.task_done()
+                    stop = True
+                    break
+                batch.append(msg)
+            with self._lock:
+                self._busy += 1
+            try:
+                with self.app.app_context():
+                    self._send(batch[:])
+            finally:
+                with self._lock:
+                    self._busy -= 1
+                for _ in batch:
+                    self.queue.task_done()
+
+    def _send(self, batch):
+        attempts = 0
+        while batch:
+            try:
+                with mail.connect() as conn:
+                    self._count('connections')
+                    while batch:
+                        conn.send(batch[0])
+                        batch.pop(0)
+                        attempts = 0
+                        self._count('sent')
+            except (smtplib.SMTPException, OSError):
+                attempts += 1
+                if attempts > self.retries:
+                    self.app.logger.exception(
+                        'Giving up sending mail: %s', batch[0].subject)
+                    batch.pop(0)
+                    attempts = 0
+                    self._count('failed')
+                    continue
+                self._count('retries')
+                time.sleep(self.backoff * 2 ** (attempts - 1))
+            except Exception:
+                # A message that can't be built or sent (a newline in its
+                # subject, say) won't do better on a retry; drop it and keep
+                # the worker alive for the rest
+                self.app.logger.exception('Could not send mail: %s', batch[0].subject)
+                batch.pop(0)
+                attempts = 0
+                self._count('failed')
+
+    def shutdown(self, timeout=10):
+        """Let the workers finish what's queued, for up to `timeout` seconds."""
+        workers, self._workers = self._workers, []
+        for _ in workers:
+            try:
+                self.queue.put(None, timeout=timeout)
+            except Full:
+                break
+        deadline = time.monotonic() + timeout
+        for worker in workers:
+            worker.join(max(deadline - time.monotonic(), 0))
+
+mail_queue = LocalProxy(lambda: current_app.extensions['mail_queue'])
+
+def send_email(subject, sender, recipients, text_body, html_body, timeout=1):
     msg = Message(subject, sender=sender, recipients=recipients)
     msg.body = text_body
     msg.html = html_body
-    Thread(target=send_async_email, args=(app, msg)).start()
-
-def send_password_reset_email(user):
-    token = user.get_reset_password_token()
-    send_email(
-        'Mid-Major Madness Stock Exchange Password Reset Request',
-        sender=app.config['ADMINS'][0],
-        recipients=[user.email],
-        text_body=render_template(
-            'email/reset_password.txt',
-            user=user,
-            token=token
-        ),
-        html_body=render_template(
-            'email/reset_password.html',
-            user=user,
-            token=token
-        )
-    )
+    return mail_queue.put(msg, timeout)
+
+def send_announcement(users, subject, text_body, html_body=None):
+    """Queue one message per user; returns how many were queued and dropped.
+
+    Rather than dropping messages when the queue is full, each one waits up
+    to MAIL_ANNOUNCE_TIMEOUT seconds for the workers to make room.
+    """
+    timeout = current_app.config['MAIL_ANNOUNCE_TIMEOUT']
+    queued = dropped = 0
+    for user in users:
+        if send_email(subject, sender=current_app.config['ADMINS'][0],
+                      recipients=[user.email], text_body=text_body,
+                      html_body=html_body, timeout=timeout):
+            queued += 1
+        else:
+            # The workers made no room in all that time, so don't wait that
+            # long for every other user too
+            dropped += 1
+            timeout = 0
+    return queued, dropped
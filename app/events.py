@@ -0,0 +1,223 @@
+import atexit
+import json
+from collections import Counter, deque
+from threading import Condition, Event, Lock, Thread
+from flask import current_app
+from sqlalchemy import func, select
+from werkzeug.local import LocalProxy
+from app import db
+from app.models import User, Stock, Transaction, DataVersion
+
+class Subscriber(object):
+    """One client's bounded buffer of formatted events.
+
+    A subscriber that falls `size` events behind is closed rather than
+    allowed to hold up everyone else; its stream ends and the browser
+    reconnects.
+    """
+    def __init__(self, teams=None, usernames=None, size=100):
+        self.teams = teams
+        self.usernames = usernames
+        self.size = size
+        self.closed = False
+        self._events = deque()
+        self._ready = Condition()
+
+    def wants(self, team, username=None):
+        if self.teams is None and self.usernames is None:
+            return True
+        return bool(self.teams and team in self.teams or
+                    self.usernames and username in self.usernames)
+
+    def put(self, event):
+        """Buffer an event; returns False if the subscriber is (now) closed."""
+        with self._ready:
+            if self.closed:
+                return False
+            if len(self._events) >= self.size:
+                self.closed = True
+            else:
+                self._events.append(event)
+            self._ready.notify()
+            return not self.closed
+
+    def get(self, timeout):
+        """The next event, '' if none came within `timeout`, None once closed."""
+        with self._ready:
+            if not self._events and not self.closed:
+                self._ready.wait(timeout)
+            if self._events:
+                return self._events.popleft()
+            return None if self.closed else ''
+
+    def close(self):
+        with self._ready:
+            self.closed = True
+            self._ready.notify()
+
+def format_event(name, data):
+    return 'event: {}\ndata: {}\n\n'.format(name, json.dumps(data))
+
+class Broadcaster(object):
+    """Pushes price changes and trades to every subscribed client.
+
+    One thread per process polls the 'prices' and 'trades' data versions
+    every `interval` seconds, so it sees update_stocks.py and trades made in
+    other workers; poke() wakes it at once after a trade here. On a change
+    it reads the new prices or transactions once, formats each event once
+    and hands it to every interested subscriber. The thread starts with the
+    first subscriber.
+    """
+    def __init__(self, app=None):
+        self._subscribers = set()
+        self._counts = Counter()
+        self._lock = Lock()
+        self._wake = Event()
+        self._stopped = False
+        self._thread = None
+        self.app = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.interval = app.config['EVENTS_POLL_INTERVAL']
+        self.queue_size = app.config['EVENTS_QUEUE_SIZE']
+        self.keepalive = app.config['EVENTS_KEEPALIVE']
+        app.extensions['broadcaster'] = self
+        atexit.register(self.shutdown)
+
+    def subscribe(self, teams=None, usernames=None):
+        subscriber = Subscriber(teams, usernames, self.queue_size)
+        with self._lock:
+            idle = not self._subscribers
+            self._subscribers.add(subscriber)
+            if self._thread is None:
+                self._thread = Thread(target=self._run, name='events')
+                self._thread.daemon = True
+                self._thread.start()
+            elif idle:
+                # Read where things stand now, rather than at the next poll
+                self._wake.set()
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        subscriber.close()
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    def poke(self):
+        """Check for new trades and prices now rather than at the next poll."""
+        self._wake.set()
+
+    def publish(self, name, data, team, username=None):
+        """Send an event to the subscribers that want it; returns how many."""
+        event = format_event(name, data)
+        with self._lock:
+            subscribers = [s for s in self._subscribers if s.wants(team, username)]
+        sent = dropped = 0
+        for subscriber in subscribers:
+            if subscriber.put(event):
+                sent += 1
+            else:
+                dropped += 1
+                with self._lock:
+                    self._subscribers.discard(subscriber)
+        with self._lock:
+            self._counts['published'] += 1
+            self._counts['delivered'] += sent
+            self._counts['dropped'] += dropped
+        return sent
+
+    def stream(self, subscriber):
+        """The text/event-stream body for a subscriber."""
+        try:
+            yield 'retry: {:d}\n\n'.format(int(self.interval * 1000) + 1000)
+            while True:
+                event = subscriber.get(self.keepalive)
+                if event is None:
+                    return
+                # A comment line keeps proxies from timing out idle streams
+                yield event or ': keepalive\n\n'
+        finally:
+            self.unsubscribe(subscriber)
+
+    def metrics(self):
+        with self._lock:
+            metrics = dict(self._counts)
+            metrics['subscribers'] = len(self._subscribers)
+        return metrics
+
+    def _versions(self, conn):
+        versions = DataVersion.__table__
+        return dict(conn.execute(
+            select([versions.c.name, versions.c.version])
+            .where(versions.c.name.in_(['prices', 'trades']))).fetchall())
+
+    def _prices(self, conn):
+        stocks = Stock.__table__
+        return dict(conn.execute(select([stocks.c.name, stocks.c.price])).fetchall())
+
+    def _trades(self, conn, after):
+        transactions = Transaction.__table__
+        users = User.__table__
+        return conn.execute(
+            select([transactions, users.c.username])
+            .select_from(transactions.join(users, users.c.id == transactions.c.user_id))
+            .where(transactions.c.id > after)
+            .order_by(transactions.c.id)).fetchall()
+
+    def _run(self):
+        # None until the current versions, prices and last trade are read,
+        # and again whenever nobody is subscribed, so a subscriber arriving
+        # after an idle spell starts from now rather than getting a backlog
+        versions = prices = last_trade = None
+        with self.app.app_context():
+            while not self._stopped:
+                if not self._subscribers:
+                    versions = None
+                else:
+                    try:
+                        with db.engine.connect() as conn:
+                            latest = self._versions(conn)
+                            if versions is None:
+                                prices = self._prices(conn)
+                                last_trade = conn.execute(select(
+                                    [func.max(Transaction.__table__.c.id)])).scalar() or 0
+                            else:
+                                if latest.get('prices') != versions.get('prices'):
+                                    prices = self._publish_prices(prices, self._prices(conn))
+                                if latest.get('trades') != versions.get('trades'):
+                                    last_trade = self._publish_trades(
+                                        self._trades(conn, last_trade), last_trade)
+                            versions = latest
+                    except Exception:
+                        # Try again at the next poll
+                        self.app.logger.exception('Event poll failed')
+                self._wake.wait(self.interval)
+                self._wake.clear()
+
+    def _publish_prices(self, old, new):
+        for team, price in sorted(new.items()):
+            if price != old.get(team):
+                self.publish('price', {'team': team, 'price': price}, team)
+        return new
+
+    def _publish_trades(self, trades, last_trade):
+        for t in trades:
+            self.publish('trade', {
+                'id': t.id, 'team': t.team, 'username': t.username,
+                'shares': t.shares, 'price': t.price, 'buy_or_sell': t.buy_or_sell,
+                'timestamp': t.timestamp.isoformat() + 'Z'}, t.team, t.username)
+            last_trade = t.id
+        return last_trade
+
+    def shutdown(self):
+        self._stopped = True
+        self._wake.set()
+        with self._lock:
+            subscribers, self._subscribers = self._subscribers, set()
+        for subscriber in subscribers:
+            subscriber.close()
+
+broadcaster = LocalProxy(lambda: current_app.extensions['broadcaster'])
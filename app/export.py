@@ -0,0 +1,200 @@
+import csv
+import gzip
+import json
+import os
+from sqlalchemy import and_, func, or_
+from app import db
+from app.models import StockPriceHistory
+from app.prices import PricePoint
+
+EXPORT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
+LAYOUTS = ('long', 'wide')
+FORMATS = ('csv', 'csv.gz', 'parquet')
+COLUMNS = ['name', 'date', 'price']
+
+def export_name(layout='long', fmt='csv'):
+    if layout not in LAYOUTS:
+        raise ValueError('Unknown layout: {}'.format(layout))
+    if fmt not in FORMATS:
+        raise ValueError('Unknown format: {}'.format(fmt))
+    suffix = '_wide' if layout == 'wide' else ''
+    return 'stock_price_history{}.{}'.format(suffix, fmt)
+
+# Every export the download route will serve
+DOWNLOADS = frozenset(export_name(l, f) for l in LAYOUTS for f in FORMATS)
+
+def export_format(path):
+    for fmt in sorted(FORMATS, key=len, reverse=True):
+        if path.endswith('.' + fmt):
+            return fmt
+    raise ValueError('Unknown export format: {}'.format(path))
+
+def last_price_id():
+    """The newest price history row's id, or 0 if there are none."""
+    return db.session.query(func.max(StockPriceHistory.id)).scalar() or 0
+
+def stream_prices(after_id=None, through_id=None, chunk_size=10000):
+    """Yield lists of PricePoints in (date, name) order.
+
+    Only rows with ids after `after_id` and up to `through_id` are read, so
+    a price loaded later for a date that was already exported is still
+    picked up. Pages through the table by (date, name) so at most chunk_size
+    rows are held at once.
+    """
+    last = None
+    while True:
+        query = db.session.query(
+            StockPriceHistory.name, StockPriceHistory.date, StockPriceHistory.price)
+        if after_id is not None:
+            query = query.filter(StockPriceHistory.id > after_id)
+        if through_id is not None:
+            query = query.filter(StockPriceHistory.id <= through_id)
+        if last is not None:
+            query = query.filter(or_(
+                StockPriceHistory.date > last.date,
+                and_(StockPriceHistory.date == last.date,
+                     StockPriceHistory.name > last.name)))
+        rows = [PricePoint(*row) for row in query
+                .order_by(StockPriceHistory.date, StockPriceHistory.name)
+                .limit(chunk_size)]
+        if rows:
+            yield rows
+        if len(rows) < chunk_size:
+            return
+        last = rows[-1]
+
+def _manifest_path(path):
+    return path + '.json'
+
+def read_manifest(path):
+    """What an export holds, or None if it needs writing from scratch."""
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(_manifest_path(path)) as f:
+            manifest = json.load(f)
+    except (IOError, ValueError):
+        return None
+    # Manifests from before exports tracked row ids only have a last date,
+    # which misses prices loaded later for dates already exported
+    if 'last_id' not in manifest:
+        return None
+    return manifest
+
+def _write_manifest(path, layout, last_id, rows):
+    with open(_manifest_path(path), 'w') as f:
+        json.dump({'layout': layout, 'rows': rows, 'last_id': last_id}, f)
+
+def forget(path):
+    """Drop an export's manifest so the next export_prices() rewrites it."""
+    if os.path.exists(_manifest_path(path)):
+        os.remove(_manifest_path(path))
+
+def _open(path, mode, compress):
+    if compress:
+        return gzip.open(path, mode + 't', newline='')
+    return open(path, mode, newline='')
+
+def _frame(points):
+    # pandas is only imported by the exports that need a frame
+    import pandas as pd
+    return pd.DataFrame(
+        [(p.name, p.date.isoformat(), round(p.price, 2)) for p in points],
+        columns=COLUMNS)
+
+def wide(frame):
+    """A long (name, date, price) frame as one row per team, one column per date."""
+    return frame.pivot(index='name', columns='date', values='price')
+
+def write_frame(path, frame, index=False):
+    """Write a frame in the format its path names, replacing the file atomically."""
+    fmt = export_format(path)
+    temp = path + '.tmp'
+    if fmt == 'parquet':
+        if index:
+            frame = frame.reset_index()
+        frame.to_parquet(temp, index=False)
+    else:
+        frame.to_csv(temp, index=index,
+                     compression='gzip' if fmt == 'csv.gz' else None)
+    os.replace(temp, path)
+
+def _append_csv(path, chunks, fresh):
+    # gzip files may hold several members, so appending a new one works too.
+    # Each update is appended in date order, after what's already there
+    added = 0
+    target = path + '.tmp' if fresh else path
+    with _open(target, 'w' if fresh else 'a', path.endswith('.gz')) as f:
+        writer = csv.writer(f)
+        if fresh:
+            writer.writerow(COLUMNS)
+        for chunk in chunks:
+            writer.writerows(
+                (p.name, p.date.isoformat(), round(p.price, 2)) for p in chunk)
+            added += len(chunk)
+    if fresh:
+        os.replace(target, path)
+    return added
+
+def _rewrite_frame(path, layout, chunks, fresh):
+    # Wide files grow a column per date and Parquet can't be appended to, so
+    # the existing file is read back and rewritten with the new prices added
+    import pandas as pd
+    fmt = export_format(path)
+    frames = [_frame(chunk) for chunk in chunks]
+    if not frames and not fresh:
+        return 0
+    new = pd.concat(frames) if frames else pd.DataFrame(columns=COLUMNS)
+    added = len(new)
+    if layout == 'wide':
+        new = wide(new)
+        if not fresh:
+            if fmt == 'parquet':
+                old = pd.read_parquet(path).set_index('name')
+            else:
+                old = pd.read_csv(path, index_col='name')
+            # New prices may fill in dates that already have a column
+            new = new.combine_first(old)
+        write_frame(path, new.sort_index().sort_index(axis=1), index=True)
+    else:
+        if not fresh:
+            new = pd.concat([pd.read_parquet(path), new])\
+                .sort_values(['date', 'name'], kind='mergesort')
+        write_frame(path, new)
+    return added
+
+def export_prices(path, layout='long', chunk_size=10000):
+    """Bring an export of the daily price history up to date.
+
+    Only rows added since the last export, by id, are read from the
+    database, whatever their date. Long CSVs are appended to; wide and
+    Parquet exports are rewritten with the new prices added. Returns the
+    number of prices added.
+    """
+    if layout not in LAYOUTS:
+        raise ValueError('Unknown layout: {}'.format(layout))
+    manifest = read_manifest(path)
+    fresh = manifest is None or manifest.get('layout') != layout
+    after_id, rows = None, 0
+    if not fresh:
+        after_id, rows = manifest['last_id'], manifest['rows']
+    # Rows committed while this export runs wait for the next one
+    through_id = last_price_id()
+    chunks = stream_prices(after_id, through_id, chunk_size)
+    if layout == 'long' and export_format(path) != 'parquet':
+        added = _append_csv(path, chunks, fresh)
+    else:
+        added = _rewrite_frame(path, layout, chunks, fresh)
+    if fresh or added:
+        _write_manifest(path, layout, through_id, rows + added)
+    return added
+
+def refresh_exports():
+    """Update the default CSV and any other export that has been made."""
+    added = {}
+    for name in sorted(DOWNLOADS):
+        path = os.path.join(EXPORT_DIR, name)
+        if name == export_name() or read_manifest(path) is not None:
+            layout = 'wide' if '_wide' in name else 'long'
+            added[name] = export_prices(path, layout)
+    return added
@@ -0,0 +1,53 @@
+from collections import namedtuple
+from datetime import datetime
+from sqlalchemy import desc, or_
+from app import db
+from app.models import User, Transaction
+
+Page = namedtuple('Page', ['items', 'next_cursor'])
+
+_CURSOR_FORMAT = '%Y%m%d%H%M%S%f'
+
+class BadCursor(ValueError):
+    """A page cursor that wasn't made by encode_cursor()."""
+    pass
+
+def encode_cursor(transaction):
+    """Where the next page starts: the last row's timestamp and id."""
+    return '{}-{}'.format(transaction.timestamp.strftime(_CURSOR_FORMAT), transaction.id)
+
+def decode_cursor(cursor):
+    try:
+        timestamp, id = cursor.split('-')
+        return datetime.strptime(timestamp, _CURSOR_FORMAT), int(id)
+    except ValueError:
+        raise BadCursor('Not a valid cursor: {}'.format(cursor))
+
+def trade_history(user_id=None, team=None, buy_or_sell=None, cursor=None, per_page=25):
+    """A page of trades with their usernames, newest first.
+
+    Pages are keyed on (timestamp, id) rather than an offset: each one starts
+    just past the last row of the one before, so the (user_id, timestamp) and
+    (team, timestamp) indexes find it straight away however deep it is.
+    """
+    query = db.session.query(Transaction, User.username)\
+        .join(User, Transaction.user_id == User.id)
+    if user_id is not None:
+        query = query.filter(Transaction.user_id == user_id)
+    if team is not None:
+        query = query.filter(Transaction.team == team)
+    if buy_or_sell is not None:
+        query = query.filter(Transaction.buy_or_sell == buy_or_sell)
+    if cursor is not None:
+        timestamp, id = decode_cursor(cursor)
+        # The redundant <= gives the planner a plain range on the index
+        query = query.filter(Transaction.timestamp <= timestamp, or_(
+            Transaction.timestamp < timestamp, Transaction.id < id))
+    # One extra row says whether there is another page
+    rows = query.order_by(desc(Transaction.timestamp), desc(Transaction.id))\
+        .limit(per_page + 1).all()
+    next_cursor = None
+    if len(rows) > per_page:
+        rows = rows[:per_page]
+        next_cursor = encode_cursor(rows[-1][0])
+    return Page(rows, next_cursor)
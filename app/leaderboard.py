@@ -0,0 +1,122 @@
+from bisect import bisect_left, insort
+from collections import namedtuple
+from threading import RLock
+from flask import current_app
+from sqlalchemy import func
+from werkzeug.local import LocalProxy
+from app import db
+from app.models import User, Holding, Stock, Transaction
+from app.valuation import current_valuation, data_markers
+
+LeaderboardEntry = namedtuple('LeaderboardEntry', ['rank', 'user_id', 'username', 'value'])
+
+def portfolio_values(user_ids):
+    """Portfolio value for the given users in one query."""
+    holdings_value = db.session.query(
+            Holding.user_id,
+            func.sum(Holding.shares * Stock.price).label('value'))\
+        .join(Stock, Holding.stock == Stock.name)\
+        .filter(Holding.user_id.in_(user_ids))\
+        .group_by(Holding.user_id)\
+        .subquery()
+    query = db.session.query(
+            User.id, User.username,
+            User.cash + func.coalesce(holdings_value.c.value, 0))\
+        .outerjoin(holdings_value, holdings_value.c.user_id == User.id)\
+        .filter(User.id.in_(user_ids))
+    return [(id, username, round(value or 0, 2)) for id, username, value in query]
+
+class Leaderboard(object):
+    """Every portfolio ranked by value, kept in memory.
+
+    Entries live in a list sorted by (-value, user_id), so the top N is a slice
+    and a user's rank is a binary search. A new price snapshot rebuilds the
+    whole board from the valuation engine; trades and sign ups only re-value the
+    users they touched.
+
+    Moving a user is a binary search plus a list delete and insert, which is
+    O(n) but only a memmove: tens of microseconds at 100,000 users (see
+    benchmarks/bench_leaderboard.py), well under the query that re-values
+    them. A balanced tree would make it O(log n) at the cost of slower slices.
+    """
+    def __init__(self, app=None):
+        self._keys = []
+        self._values = {}
+        self._usernames = {}
+        self._markers = None
+        self._lock = RLock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.extensions['leaderboard'] = self
+
+    def __len__(self):
+        return len(self._keys)
+
+    def load(self, rows):
+        with self._lock:
+            self._values = {}
+            self._usernames = {}
+            for user_id, username, value in rows:
+                self._values[user_id] = value
+                self._usernames[user_id] = username
+            self._keys = sorted((-v, u) for u, v in self._values.items())
+
+    def set(self, user_id, username, value):
+        with self._lock:
+            old = self._values.get(user_id)
+            if old is not None:
+                del self._keys[bisect_left(self._keys, (-old, user_id))]
+            self._values[user_id] = value
+            self._usernames[user_id] = username
+            insort(self._keys, (-value, user_id))
+
+    def rank(self, user_id):
+        with self._lock:
+            value = self._values.get(user_id)
+            if value is None:
+                return None
+            return bisect_left(self._keys, (-value, user_id)) + 1
+
+    def _entries(self, start, stop):
+        return [LeaderboardEntry(i + 1, u, self._usernames[u], -v)
+                for i, (v, u) in enumerate(self._keys[start:stop], start)]
+
+    def top(self, n):
+        with self._lock:
+            return self._entries(0, n)
+
+    def around(self, user_id, neighbours=2):
+        """The user's entry with up to `neighbours` entries either side."""
+        with self._lock:
+            rank = self.rank(user_id)
+            if rank is None:
+                return []
+            start = max(rank - 1 - neighbours, 0)
+            return self._entries(start, rank + neighbours)
+
+    def update_users(self, user_ids):
+        for user_id, username, value in portfolio_values(user_ids):
+            self.set(user_id, username, value)
+
+    def refresh(self):
+        """Bring the board up to date with the database."""
+        markers = data_markers()
+        with self._lock:
+            if markers == self._markers:
+                return
+            if self._markers is None or markers[0] != self._markers[0]:
+                self.load(current_valuation().rows())
+            else:
+                last_transaction, last_user = self._markers[1:]
+                traders = db.session.query(Transaction.user_id.distinct())\
+                    .filter(Transaction.id > (last_transaction or 0))
+                joiners = db.session.query(User.id)\
+                    .filter(User.id > (last_user or 0))
+                user_ids = set(u for u, in traders) | set(u for u, in joiners)
+                if user_ids:
+                    self.update_users(list(user_ids))
+            self._markers = markers
+
+leaderboard = LocalProxy(lambda: current_app.extensions['leaderboard'])
@@ -0,0 +1,57 @@
+from flask_wtf import FlaskForm
+from wtforms import SubmitField, RadioField, IntegerField, SelectField
+from wtforms.validators import ValidationError, DataRequired
+from flask_login import current_user
+from app.models import Holding
+from app.trading import market_is_open
+from app.catalog import catalog
+
+class StockField(SelectField):
+    """A select of every stock, served from the stock catalog.
+
+    The submitted name is looked up in the catalog's dict, and data is the
+    catalog entry with the stock's name and price.
+    """
+    def iter_choices(self):
+        for entry in catalog.refresh().all():
+            yield (entry.name, str(entry), self.data is not None and entry.name == self.data.name)
+
+    def process_data(self, value):
+        self.data = value
+
+    def process_formdata(self, valuelist):
+        if valuelist:
+            self.data = catalog.refresh().get(valuelist[0])
+
+    def pre_validate(self, form):
+        if self.data is None:
+            raise ValueError(self.gettext('Not a valid choice'))
+
+class TransactionForm(FlaskForm):
+    stock = StockField('Stock', validators=[DataRequired()])
+    shares = IntegerField('Shares', validators=[DataRequired()])
+    transactions = [("buy", "Buy"), ("sell", "Sell")]
+    buy_or_sell = RadioField('Transaction Type', choices=transactions, validators=[DataRequired()])
+    submit = SubmitField('Complete Transaction')
+    
+    def validate_stock(self, stock):
+        if not market_is_open():
+            raise ValidationError('The market is closed. Come back after 8 a.m. EST tomorrow.')
+
+    def validate_shares(self, shares):
+        if self.stock.data is None:
+            return
+        if self.buy_or_sell.data == "buy":
+            if current_user.cash < (shares.data * self.stock.data.price):
+                raise ValidationError('You cannot afford this many shares.')
+        elif self.buy_or_sell.data == "sell":
+            holding = Holding.query\
+                .filter_by(
+                    user_id=current_user.id, 
+                    stock=self.stock.data.name
+                ).first()
+            if holding:
+                if shares.data > holding.shares:
+                    raise ValidationError('You do not own enough of this team.')
+            else:
+                raise ValidationError('You do not own this team.')
@@ -0,0 +1,204 @@
+from flask import render_template, flash, redirect, url_for, request, abort, current_app
+from flask import send_from_directory, Response
+from flask_login import current_user, login_required
+from sqlalchemy import desc, func
+from app import db
+from app.main import bp
+from app.main.forms import TransactionForm
+from app.database import read_only
+from app.caching import Deferred, conditional
+from app.email import mail_queue
+from app.activity import activity
+from app.metrics import metrics
+from app.events import broadcaster
+from app.charts import team_chart
+from app.export import EXPORT_DIR, DOWNLOADS
+from app.history import trade_history, BadCursor
+from app.catalog import catalog
+from app.leaderboard import leaderboard
+from app.portfolio import load_portfolio
+from app.trading import execute_trade, TradeError
+from app.analytics import top_stocks, most_traded, recent_transactions
+from app.models import User, Holding, Transaction
+from app.models import PortfolioSnapshot, StockRollup
+
+@bp.before_app_request
+def before_request():
+    if current_user.is_authenticated:
+        activity.seen(current_user.id)
+
+@bp.route('/')
+@bp.route('/index')
+def index():
+    return render_template('index.html', title='Home')
+
+@bp.route('/user/<username>')
+@login_required
+@read_only
+def user(username):
+    user = User.query.filter_by(username=username).first_or_404()
+    portfolio = load_portfolio(user)
+    transactions = Transaction\
+        .query\
+        .filter_by(user_id=user.id)\
+        .order_by(desc(Transaction.timestamp))\
+        .limit(10)
+    leaderboard.refresh()
+    snapshots = db.session.query(PortfolioSnapshot.date, PortfolioSnapshot.value)\
+        .filter(PortfolioSnapshot.user_id == user.id)\
+        .order_by(PortfolioSnapshot.date)\
+        .all()
+    value_chart = None
+    if snapshots:
+        import pygal
+        value_chart = pygal.Line(
+                        width=600, height=300,
+                        explicit_size=True, title='Portfolio Value',
+                        x_label_rotation=20,
+                        disable_xml_declaration=True,
+                        show_legend=False
+                  )
+        value_chart.x_labels = [
+            s.date if s.date.weekday() == 0 else "" for s in snapshots
+        ]
+        value_chart.add('Value', [s.value for s in snapshots])
+    last_seen = activity.last_seen(user.id) or user.last_seen
+    return render_template('user.html', user=user, portfolio=portfolio,
+                last_seen=last_seen,
+                transactions=transactions, value_chart=value_chart,
+                rank=leaderboard.rank(user.id), total_users=len(leaderboard))
+
+@bp.route('/transaction', methods=['GET', 'POST'])
+@login_required
+def transaction():
+    form = TransactionForm()
+    if form.validate_on_submit():
+        try:
+            execute_trade(
+                current_user.id,
+                form.stock.data.name,
+                form.shares.data,
+                form.buy_or_sell.data
+            )
+        except TradeError as e:
+            flash(str(e))
+            return redirect(url_for('main.transaction'))
+        leaderboard.update_users([current_user.id])
+        broadcaster.poke()
+        flash('Trade submitted!')
+        return redirect(url_for('main.user', username=current_user.username))
+    return render_template('transaction.html', title='Transaction', form=form)
+
+@bp.route('/leaders')
+@login_required
+@read_only
+@conditional('prices', 'trades', 'users')
+def leaders():
+    leaderboard.refresh()
+    leaders = leaderboard.top(20)
+    neighbours = leaderboard.around(current_user.id)
+    return render_template('leaders.html', title='Leaders', leaders=leaders,
+                neighbours=neighbours)
+
+@bp.route('/analytics')
+@login_required
+@read_only
+@conditional('prices', 'trades')
+def analytics():
+    # Every table is read from the rollups kept up to date by trades and
+    # price updates, and only when its cached fragment is stale
+    return render_template('analytics.html', title='Analytics', 
+                latest_transactions=Deferred(recent_transactions),
+                volume_stocks=Deferred(top_stocks, StockRollup.shares),
+                value_stocks=Deferred(top_stocks, StockRollup.cost_basis),
+                market_value_stocks=Deferred(top_stocks, StockRollup.market_value),
+                most_traded=Deferred(most_traded)
+            )
+
+@bp.route('/transactions')
+@bp.route('/user/<username>/transactions')
+@login_required
+@read_only
+def transactions(username=None):
+    user = None
+    if username is not None:
+        user = User.query.filter_by(username=username).first_or_404()
+    team = request.args.get('team') or None
+    buy_or_sell = request.args.get('type') or None
+    if buy_or_sell not in (None, 'buy', 'sell'):
+        abort(400)
+    try:
+        page = trade_history(user.id if user else None, team, buy_or_sell,
+                             request.args.get('cursor'),
+                             current_app.config['TRANSACTIONS_PER_PAGE'])
+    except BadCursor:
+        abort(400)
+    next_url = url_for('main.transactions', username=username, team=team,
+                       type=buy_or_sell, cursor=page.next_cursor) \
+        if page.next_cursor else None
+    title = '{} Transactions'.format(user.username) if user else 'Transactions'
+    return render_template('transactions.html', title=title, user=user,
+                transactions=page.items, next_url=next_url,
+                teams=catalog.refresh().all(), team=team,
+                buy_or_sell=buy_or_sell)
+
+@bp.route('/events')
+@login_required
+def events():
+    # Streams until the client goes away; ?team= and ?user= (repeatable)
+    # narrow it to those teams' prices and trades and those users' trades
+    subscriber = broadcaster.subscribe(set(request.args.getlist('team')) or None,
+                                       set(request.args.getlist('user')) or None)
+    return Response(broadcaster.stream(subscriber), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@bp.route('/downloads/<filename>')
+def download(filename):
+    if filename not in DOWNLOADS:
+        abort(404)
+    # Streamed from disk with an ETag and Last-Modified; max-age=0 makes
+    # clients revalidate and get a 304 until the export changes
+    return send_from_directory(EXPORT_DIR, filename, conditional=True,
+                               cache_timeout=0)
+
+@bp.route('/metrics')
+def prometheus_metrics():
+    mail = mail_queue.metrics()
+    gauges = dict(('exchange_mail_' + name, mail.pop(name, 0))
+                  for name in ('queue_depth', 'busy_workers', 'workers'))
+    counters = dict(('exchange_mail_{}_total'.format(name), count)
+                    for name, count in mail.items())
+    events = broadcaster.metrics()
+    gauges['exchange_event_subscribers'] = events.pop('subscribers')
+    counters.update(('exchange_events_{}_total'.format(name), count)
+                    for name, count in events.items())
+    return metrics.render(gauges, counters), 200, \
+        {'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'}
+
+@bp.route('/team/<teamname>')
+@login_required
+@read_only
+@conditional('price:{teamname}', 'trades:{teamname}')
+def team(teamname):
+    team = catalog.refresh().get(teamname)
+    if team is None:
+        abort(404)
+    chart = team_chart(teamname)
+    if chart is None:
+        abort(404)
+    
+    holdings = db.session.query(User.username, Holding.shares)\
+        .join(User, Holding.user_id == User.id)\
+        .filter(Holding.stock == teamname)\
+        .order_by(desc(Holding.shares))\
+        .limit(5)
+    total_holdings = db.session.query(func.coalesce(func.sum(Holding.shares), 0))\
+        .filter(Holding.stock == teamname)
+    
+    return render_template(
+        'team.html', team=team,
+        max_price=chart.max_price,
+        min_price=chart.min_price,
+        total_holdings=Deferred(total_holdings.scalar),
+        holdings=Deferred(holdings.all),
+        line_chart=chart.svg, title=chart.title)
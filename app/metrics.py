@@ -0,0 +1,151 @@
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from threading import Lock
+from flask import current_app, g, has_request_context, request
+from flask import before_render_template, template_rendered
+from sqlalchemy import event
+from werkzeug.local import LocalProxy
+from app import db
+
+TIME_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200)
+
+class Histogram(object):
+    """Prometheus-style cumulative histogram of observed values."""
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def lines(self, name, labels):
+        total = 0
+        for bound, count in zip(self.buckets + ('+Inf',), self.counts):
+            total += count
+            yield '{}_bucket{{{},le="{}"}} {}'.format(name, labels, bound, total)
+        yield '{}_sum{{{}}} {}'.format(name, labels, self.sum)
+        yield '{}_count{{{}}} {}'.format(name, labels, self.count)
+
+def _label(value):
+    return str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+
+class RequestMetrics(object):
+    """Per-endpoint timings, SQL counts and template render times.
+
+    Every request records its wall time, how many SQL statements it ran and
+    how long they took, and how long its templates took to render, into
+    histograms labelled by endpoint. Statements slower than
+    `slow_query_threshold` are logged with the route that ran them. The
+    numbers are per process; render() gives them in Prometheus text format.
+    """
+    HISTOGRAMS = [
+        ('exchange_request_duration_seconds', 'Time to handle a request.', TIME_BUCKETS),
+        ('exchange_request_sql_queries', 'SQL statements run by a request.', COUNT_BUCKETS),
+        ('exchange_request_sql_duration_seconds', 'Time a request spent in SQL.', TIME_BUCKETS),
+        ('exchange_request_template_seconds', 'Time a request spent rendering templates.',
+         TIME_BUCKETS),
+    ]
+
+    def __init__(self, app=None):
+        self._lock = Lock()
+        self._histograms = dict(
+            (name, defaultdict(lambda b=buckets: Histogram(b)))
+            for name, _, buckets in self.HISTOGRAMS)
+        self._requests = defaultdict(int)
+        self._slow_queries = defaultdict(int)
+        self.app = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.slow_query_threshold = app.config['SLOW_QUERY_THRESHOLD']
+        app.extensions['metrics'] = self
+        app.before_request(self._start_request)
+        app.after_request(self._end_request)
+        before_render_template.connect(self._start_template, app)
+        template_rendered.connect(self._end_template, app)
+        for engine in filter(None, [db.get_engine(app), db.read_engine(app)]):
+            event.listen(engine, 'before_cursor_execute', self._start_query)
+            event.listen(engine, 'after_cursor_execute', self._end_query)
+
+    def _start_request(self):
+        g.metrics = {'start': time.perf_counter(), 'queries': 0, 'sql': 0.0,
+                     'template': 0.0, 'template_start': []}
+
+    def _end_request(self, response):
+        stats = g.pop('metrics', None)
+        if stats is None:
+            return response
+        endpoint = request.endpoint or 'unmatched'
+        elapsed = time.perf_counter() - stats['start']
+        with self._lock:
+            self._requests[(endpoint, response.status_code)] += 1
+            for name, value in [
+                    ('exchange_request_duration_seconds', elapsed),
+                    ('exchange_request_sql_queries', stats['queries']),
+                    ('exchange_request_sql_duration_seconds', stats['sql']),
+                    ('exchange_request_template_seconds', stats['template'])]:
+                self._histograms[name][endpoint].observe(value)
+        return response
+
+    def _start_template(self, sender, template, context, **extra):
+        if has_request_context() and 'metrics' in g:
+            g.metrics['template_start'].append(time.perf_counter())
+
+    def _end_template(self, sender, template, context, **extra):
+        if has_request_context() and 'metrics' in g and g.metrics['template_start']:
+            g.metrics['template'] += time.perf_counter() - g.metrics['template_start'].pop()
+
+    def _start_query(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+    def _end_query(self, conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info['query_start'].pop()
+        if not has_request_context():
+            return
+        endpoint = request.endpoint or 'unmatched'
+        if 'metrics' in g:
+            g.metrics['queries'] += 1
+            g.metrics['sql'] += elapsed
+        if elapsed >= self.slow_query_threshold:
+            with self._lock:
+                self._slow_queries[endpoint] += 1
+            self.app.logger.warning('Slow query (%.3fs) in %s %s: %s',
+                                    elapsed, endpoint, request.path, statement)
+
+    def render(self, gauges=None, counters=None):
+        """Everything recorded so far, in Prometheus text format.
+
+        `gauges` and `counters` map extra metric names to values to include.
+        """
+        lines = []
+        with self._lock:
+            lines.append('# HELP exchange_requests_total Requests handled.')
+            lines.append('# TYPE exchange_requests_total counter')
+            for (endpoint, status), count in sorted(self._requests.items()):
+                lines.append('exchange_requests_total{{endpoint="{}",status="{}"}} {}'.format(
+                    _label(endpoint), status, count))
+            lines.append('# HELP exchange_slow_queries_total SQL statements over the slow query threshold.')
+            lines.append('# TYPE exchange_slow_queries_total counter')
+            for endpoint, count in sorted(self._slow_queries.items()):
+                lines.append('exchange_slow_queries_total{{endpoint="{}"}} {}'.format(
+                    _label(endpoint), count))
+            for name, help, _ in self.HISTOGRAMS:
+                lines.append('# HELP {} {}'.format(name, help))
+                lines.append('# TYPE {} histogram'.format(name))
+                for endpoint, histogram in sorted(self._histograms[name].items()):
+                    lines.extend(histogram.lines(name, 'endpoint="{}"'.format(_label(endpoint))))
+        for kind, values in [('gauge', gauges), ('counter', counters)]:
+            for name, value in sorted((values or {}).items()):
+                lines.append('# TYPE {} {}'.format(name, kind))
+                lines.append('{} {}'.format(name, value))
+        return '\n'.join(lines) + '\n'
+
+metrics = LocalProxy(lambda: current_app.extensions['metrics'])
@@ -2,7 +2,8 @@ from werkzeug.security import generate_password_hash, check_password_hash
 from flask_login import UserMixin
 from datetime import datetime
 from time import time
-from app import app, db, login
+from flask import current_app
+from app import db, login
 from hashlib import md5
 from sqlalchemy.ext.hybrid import hybrid_property, hybrid_method
 import jwt
@@ -21,6 +22,7 @@ class User(UserMixin, db.Model):
     cash = db.Column(db.Float, default=500.00)
     holdings = db.relationship('Holding', backref='owner', lazy='dynamic')
     transactions = db.relationship('Transaction', backref='moves', lazy='dynamic')
+    snapshots = db.relationship('PortfolioSnapshot', backref='owner', lazy='dynamic')
     
     def __repr__(self):
         return '<User {}>'.format(self.username)
@@ -34,14 +36,14 @@ class User(UserMixin, db.Model):
     def get_reset_password_token(self, expires_in=600):
         return jwt.encode(
             {'reset_password': self.id, 'exp': time() + expires_in},
-            app.config['SECRET_KEY'], algorithm='HS256').decode('utf-8')
+            current_app.config['SECRET_KEY'], algorithm='HS256').decode('utf-8')
     
     @staticmethod
     def verify_reset_password_token(token):
         try:
             id = jwt.decode(
                 token, 
-                app.config['SECRET_KEY'], 
+                current_app.config['SECRET_KEY'], 
                 algorithms=['HS256'])['reset_password']
         except:
             return
@@ -64,6 +66,9 @@ class Holding(db.Model):
     shares = db.Column(db.Integer)
     # Note: If shares are purchased at multiple prices, this is an average
     purchase_price = db.Column(db.Float)
+    __table_args__ = (
+        db.Index('ix_holding_user_id_stock', 'user_id', 'stock', unique=True),
+    )
         
     def __repr__(self):
         return '<Holding {}>'.format(self.team)
@@ -91,9 +96,63 @@ class Stock(db.Model):
 
 class StockPriceHistory(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String(120))
+    name = db.Column(db.String(120), db.ForeignKey('stock.name'))
     date = db.Column(db.Date, index=True)
     price = db.Column(db.Float)
+    __table_args__ = (
+        db.Index('ix_stock_price_history_name_date', 'name', 'date'),
+    )
+
+    def __repr__(self):
+        return '<StockPriceHistory {} {}>'.format(self.name, self.date)
+
+class PortfolioSnapshot(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'))
+    date = db.Column(db.Date, index=True)
+    value = db.Column(db.Float)
+    cash = db.Column(db.Float)
+    __table_args__ = (
+        db.Index('ix_portfolio_snapshot_user_id_date', 'user_id', 'date', unique=True),
+    )
+
+    def __repr__(self):
+        return '<PortfolioSnapshot {} {}>'.format(self.user_id, self.date)
+
+class LimitOrder(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    timestamp = db.Column(db.DateTime, default=datetime.utcnow)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), index=True)
+    team = db.Column(db.String(120), db.ForeignKey('stock.name'))
+    shares = db.Column(db.Integer)
+    # Buys fill at or below this price, sells at or above it
+    limit_price = db.Column(db.Float)
+    buy_or_sell = db.Column(db.String(120))
+    # open, filled, rejected or cancelled
+    status = db.Column(db.String(20), default='open')
+    filled_at = db.Column(db.DateTime)
+    fill_price = db.Column(db.Float)
+    note = db.Column(db.String(120))
+    __table_args__ = (
+        db.Index('ix_limit_order_status_team', 'status', 'team'),
+    )
+
+    def __repr__(self):
+        return '<LimitOrder {} {} {}>'.format(self.buy_or_sell, self.team, self.limit_price)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'timestamp': self.timestamp.isoformat() + 'Z',
+            'team': self.team,
+            'shares': self.shares,
+            'limit_price': self.limit_price,
+            'buy_or_sell': self.buy_or_sell,
+            'status': self.status,
+            'filled_at': self.filled_at.isoformat() + 'Z' if self.filled_at else None,
+            'fill_price': self.fill_price,
+            'note': self.note
+        }
 
 class Transaction(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -103,6 +162,10 @@ class Transaction(db.Model):
     team = db.Column(db.String(120))
     price = db.Column(db.Float)
     buy_or_sell = db.Column(db.String(120))
+    __table_args__ = (
+        db.Index('ix_transaction_user_id_timestamp', 'user_id', 'timestamp'),
+        db.Index('ix_transaction_team_timestamp', 'team', 'timestamp'),
+    )
     
     def __repr__(self):
         return '<Transaction {}>'.format(self.team)
@@ -110,4 +173,88 @@ class Transaction(db.Model):
     def total_cost(self):
         if self.buy_or_sell == "buy":
             return -(self.shares * self.price)
-        return self.shares * self.price
\ No newline at end of file
+        return self.shares * self.price
+
+class DataVersion(db.Model):
+    """Counters bumped whenever a kind of data changes.
+
+    Processes compare them to decide whether their caches are stale. The
+    'prices' counter and a 'price:<team>' counter per stock are bumped by
+    update_stocks.py; trades bump 'trades' and a 'trades:<team>' counter per
+    stock traded, and sign ups bump 'users'.
+    """
+    name = db.Column(db.String(64), primary_key=True)
+    version = db.Column(db.Integer, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return '<DataVersion {} {}>'.format(self.name, self.version)
+
+    @staticmethod
+    def get(name):
+        version = db.session.query(DataVersion.version)\
+            .filter(DataVersion.name == name).scalar()
+        return version or 0
+
+    @staticmethod
+    def bump(*names):
+        """Increment counters in the current transaction."""
+        names = set(names)
+        now = datetime.utcnow()
+        updated = DataVersion.query.filter(DataVersion.name.in_(names))\
+            .update({DataVersion.version: DataVersion.version + 1,
+                     DataVersion.updated_at: now},
+                    synchronize_session=False)
+        if updated < len(names):
+            names -= set(n for n, in db.session.query(DataVersion.name)
+                         .filter(DataVersion.name.in_(names)))
+            # Create the missing counters at 0, skipping any a concurrent
+            # first bump just created, then count this bump like any other
+            db.session.execute(DataVersion._insert_ignore(), [
+                {'name': name, 'version': 0, 'updated_at': now} for name in names])
+            DataVersion.query.filter(DataVersion.name.in_(names))\
+                .update({DataVersion.version: DataVersion.version + 1,
+                         DataVersion.updated_at: now},
+                        synchronize_session=False)
+
+    @staticmethod
+    def _insert_ignore():
+        """An INSERT that skips rows whose name is already there."""
+        table = DataVersion.__table__
+        dialect = db.session.get_bind().dialect.name
+        if dialect == 'postgresql':
+            from sqlalchemy.dialects.postgresql import insert
+            return insert(table).on_conflict_do_nothing(index_elements=['name'])
+        if dialect == 'mysql':
+            return table.insert().prefix_with('IGNORE')
+        return table.insert().prefix_with('OR IGNORE')
+
+
+class StockRollup(db.Model):
+    """Running totals of the shares held in a stock.
+
+    Trades add to them in app/trading.py and update_stocks.py revalues them
+    when prices change; `flask analytics rebuild` recomputes them from scratch.
+    """
+    stock = db.Column(db.String(120), db.ForeignKey('stock.name'), primary_key=True)
+    shares = db.Column(db.Integer, default=0, index=True)
+    cost_basis = db.Column(db.Float, default=0, index=True)
+    market_value = db.Column(db.Float, default=0, index=True)
+
+    def __repr__(self):
+        return '<StockRollup {} {}>'.format(self.stock, self.shares)
+
+class StockVolume(db.Model):
+    """Trades, shares and dollars traded in a stock on one day."""
+    id = db.Column(db.Integer, primary_key=True)
+    date = db.Column(db.Date)
+    stock = db.Column(db.String(120), db.ForeignKey('stock.name'))
+    trades = db.Column(db.Integer, default=0)
+    shares = db.Column(db.Integer, default=0)
+    notional = db.Column(db.Float, default=0)
+    __table_args__ = (
+        db.Index('ix_stock_volume_date_stock', 'date', 'stock', unique=True),
+    )
+
+    def __repr__(self):
+        return '<StockVolume {} {} {}>'.format(self.stock, self.date, self.shares)
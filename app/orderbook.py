@@ -0,0 +1,129 @@
+import heapq
+from collections import namedtuple
+from datetime import datetime
+from sqlalchemy import and_, bindparam, or_, select
+from app import db
+from app.models import LimitOrder, Stock
+from app.trading import execute_bulk, with_retries, swap_all
+
+OpenOrder = namedtuple('OpenOrder',
+    ['id', 'user_id', 'team', 'shares', 'limit_price', 'buy_or_sell'])
+
+class OrderBook(object):
+    """Open limit orders for one stock in price-time priority.
+
+    Buys are kept in a heap keyed by highest limit then oldest, sells by
+    lowest limit then oldest, so the orders a new price triggers are popped
+    off the top best first. Order ids increase as orders are placed, so
+    they stand in for time. The heaps hold plain (price, id) tuples, which
+    compare without touching the orders, and the orders are kept by id.
+    """
+    def __init__(self, orders=()):
+        self.orders = {}
+        self.bids = []
+        self.asks = []
+        for order in orders:
+            self.orders[order.id] = order
+            if order.buy_or_sell == 'buy':
+                self.bids.append((-order.limit_price, order.id))
+            else:
+                self.asks.append((order.limit_price, order.id))
+        heapq.heapify(self.bids)
+        heapq.heapify(self.asks)
+
+    def __len__(self):
+        return len(self.orders)
+
+    def add(self, order):
+        self.orders[order.id] = order
+        if order.buy_or_sell == 'buy':
+            heapq.heappush(self.bids, (-order.limit_price, order.id))
+        else:
+            heapq.heappush(self.asks, (order.limit_price, order.id))
+
+    def triggered(self, price):
+        """Remove and return every order `price` triggers, best first."""
+        ids = []
+        while self.bids and -self.bids[0][0] >= price:
+            ids.append(heapq.heappop(self.bids)[1])
+        while self.asks and self.asks[0][0] <= price:
+            ids.append(heapq.heappop(self.asks)[1])
+        return [self.orders.pop(id) for id in ids]
+
+def load_books(status='open'):
+    """Limit orders with a status ('open' by default), in an OrderBook per stock."""
+    orders = LimitOrder.__table__
+    # A core select: building ORM rows would dominate the matching pass
+    rows = db.session.execute(select([
+            orders.c.id, orders.c.user_id, orders.c.team, orders.c.shares,
+            orders.c.limit_price, orders.c.buy_or_sell])
+        .where(orders.c.status == status)).fetchall()
+    by_team = {}
+    for row in rows:
+        # Plain tuples: attribute lookups on result rows are slow
+        order = OpenOrder._make(row)
+        by_team.setdefault(order.team, []).append(order)
+    return dict((team, OrderBook(team_orders)) for team, team_orders in by_team.items())
+
+def _claim_triggered():
+    """Mark every open order the current prices trigger as 'matching'."""
+    orders = LimitOrder.__table__
+    stocks = Stock.__table__
+    price = select([stocks.c.price]).where(stocks.c.name == orders.c.team).as_scalar()
+    db.session.execute(orders.update()
+        .where(and_(orders.c.status == 'open', or_(
+            and_(orders.c.buy_or_sell == 'buy', orders.c.limit_price >= price),
+            and_(orders.c.buy_or_sell != 'buy', orders.c.limit_price <= price))))
+        .values(status='matching'))
+
+def _match():
+    # Claim the triggered orders in one statement, so only they are read
+    # rather than the whole book. An order cancelled first isn't claimed,
+    # and a cancel arriving now waits for this transaction and then finds
+    # the order closed. 'matching' is never committed.
+    _claim_triggered()
+    books = load_books('matching')
+    if not books:
+        return 0, 0
+    prices = dict(db.session.query(Stock.name, Stock.price))
+    triggered = []
+    for team in sorted(books):
+        if prices.get(team) is not None:
+            triggered.extend(books[team].triggered(prices[team]))
+    orders = LimitOrder.__table__
+    # Reopen any order whose price moved between the claim and now
+    swap_all(orders.update()
+        .where(and_(orders.c.id == bindparam('b_id'), orders.c.status == 'matching'))
+        .values(status='open'),
+        [{'b_id': id} for book in books.values() for id in book.orders])
+    if not triggered:
+        return 0, 0
+    results = execute_bulk(
+        [(o.user_id, o.team, o.shares, o.buy_or_sell) for o in triggered])
+    swap_all(orders.update()
+        .where(and_(orders.c.id == bindparam('b_id'), orders.c.status == 'matching'))
+        .values(status='rejected', note=bindparam('b_note')),
+        [{'b_id': order.id, 'b_note': result.error}
+         for order, result in zip(triggered, results) if not result.ok])
+    # Every order still matching is filled, at its team's price, so they're
+    # marked a team at a time rather than one by one
+    fill_prices = dict((order.team, result.price)
+                       for order, result in zip(triggered, results) if result.ok)
+    if fill_prices:
+        db.session.execute(orders.update()
+            .where(and_(orders.c.team == bindparam('b_team'), orders.c.status == 'matching'))
+            .values(status='filled', filled_at=datetime.utcnow(),
+                    fill_price=bindparam('b_price')),
+            [{'b_team': team, 'b_price': price} for team, price in fill_prices.items()])
+    filled = sum(1 for r in results if r.ok)
+    return filled, len(results) - filled
+
+def match_orders(**kwargs):
+    """Fill every open limit order that current prices trigger.
+
+    Triggered orders run through the same cash and holding rules as any
+    other trade, at the current price, in one transaction. Orders that fail
+    those rules are marked rejected with the reason. Returns the number of
+    orders filled and rejected.
+    """
+    return with_retries(_match, **kwargs)
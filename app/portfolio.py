@@ -0,0 +1,44 @@
+from collections import namedtuple
+from app import db
+from app.models import Holding, Stock
+
+class PortfolioRow(namedtuple('PortfolioRow',
+        ['stock', 'shares', 'purchase_price', 'price', 'value', 'change'])):
+    """One holding with its current price, value and change in value."""
+    __slots__ = ()
+
+    def value_change_str(self):
+        return "${0:.2f}".format(self.change).replace("$-", "-$")
+
+class Portfolio(object):
+    """A user's holdings joined to current prices, with totals."""
+    def __init__(self, user, rows):
+        self.user = user
+        self.rows = rows
+        self.cash = user.cash
+        self.holdings_value = round(sum(r.value for r in rows), 2)
+        self.change = round(sum(r.change for r in rows), 2)
+        self.value = round(self.cash + self.holdings_value, 2)
+
+    def __iter__(self):
+        return iter(self.rows)
+
+    def __len__(self):
+        return len(self.rows)
+
+    def change_str(self):
+        return "${0:,.2f}".format(self.change).replace("$-", "-$")
+
+def load_portfolio(user):
+    """Read the user's holdings and their prices in a single query."""
+    query = db.session.query(
+            Holding.stock, Holding.shares, Holding.purchase_price, Stock.price)\
+        .join(Stock, Holding.stock == Stock.name)\
+        .filter(Holding.user_id == user.id)\
+        .order_by(Holding.stock)
+    rows = []
+    for stock, shares, purchase_price, price in query:
+        value = round(shares * price, 2)
+        change = value - round(shares * purchase_price, 2)
+        rows.append(PortfolioRow(stock, shares, purchase_price, price, value, change))
+    return Portfolio(user, rows)
@@ -0,0 +1,86 @@
+from collections import OrderedDict, namedtuple
+from datetime import timedelta
+from itertools import groupby
+from operator import itemgetter
+from app import db
+from app.models import StockPriceHistory
+
+PricePoint = namedtuple('PricePoint', ['name', 'date', 'price'])
+OHLC = namedtuple('OHLC', ['name', 'date', 'open', 'high', 'low', 'close'])
+PriceTable = namedtuple('PriceTable', ['dates', 'prices'])
+
+FREQUENCIES = ('daily', 'weekly', 'ohlc')
+
+def week_start(day):
+    return day - timedelta(days=day.weekday())
+
+def _weekly(points):
+    # The last price of each week, dated by the day it was recorded
+    for _, week in groupby(points, key=lambda p: week_start(p.date)):
+        for last in week:
+            pass
+        yield last
+
+def _ohlc(points):
+    for start, week in groupby(points, key=lambda p: week_start(p.date)):
+        week = list(week)
+        prices = [p.price for p in week]
+        yield OHLC(week[0].name, start, prices[0], max(prices), min(prices), prices[-1])
+
+def _query(names, start, end):
+    query = db.session.query(
+        StockPriceHistory.name, StockPriceHistory.date, StockPriceHistory.price)
+    if names is not None:
+        query = query.filter(StockPriceHistory.name.in_(names))
+    if start is not None:
+        query = query.filter(StockPriceHistory.date >= start)
+    if end is not None:
+        query = query.filter(StockPriceHistory.date <= end)
+    return query
+
+def price_history(names=None, start=None, end=None, freq='daily'):
+    """Price history for some or all teams, ordered by team then date.
+
+    start and end bound the dates (inclusive). freq is 'daily' for every
+    point, 'weekly' for the last price of each week or 'ohlc' for a weekly
+    open/high/low/close. Served by the (name, date) index.
+    """
+    if freq not in FREQUENCIES:
+        raise ValueError('Unknown frequency: {}'.format(freq))
+    query = _query(names, start, end)\
+        .order_by(StockPriceHistory.name, StockPriceHistory.date)
+    points = (PricePoint(*row) for row in query)
+    if freq == 'daily':
+        return list(points)
+    result = []
+    for _, team_points in groupby(points, key=lambda p: p.name):
+        if freq == 'weekly':
+            result.extend(_weekly(team_points))
+        else:
+            result.extend(_ohlc(team_points))
+    return result
+
+def price_series(name, start=None, end=None, freq='daily'):
+    """Price history for one team, oldest first."""
+    return price_history([name], start, end, freq)
+
+def price_table(names=None, start=None, end=None):
+    """Daily prices for some or all teams on one shared date axis.
+
+    dates is every date any of the teams has a price for, oldest first, and
+    prices maps each team, in name order, to a list with its price (rounded
+    to cents) on each of those dates, or None where it has none. Read with
+    one query in date order, as plain rows rather than ORM results.
+    """
+    query = _query(names, start, end).order_by(StockPriceHistory.date)
+    dates = []
+    cells = dict((name, {}) for name in names or ())
+    rows = db.session.execute(query.statement).fetchall()
+    for day, group in groupby(rows, key=itemgetter(1)):
+        i = len(dates)
+        dates.append(day)
+        for name, _, price in group:
+            cells.setdefault(name, {})[i] = round(price, 2)
+    indexes = range(len(dates))
+    return PriceTable(dates, OrderedDict(
+        (name, [column.get(i) for i in indexes]) for name, column in sorted(cells.items())))
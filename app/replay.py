@@ -0,0 +1,189 @@
+from collections import namedtuple
+from itertools import groupby
+import numpy as np
+from app import db
+from app.models import User, Stock, StockPriceHistory, Transaction
+
+# Matches the User.cash default every portfolio starts with
+STARTING_CASH = 500.00
+
+DailyState = namedtuple('DailyState',
+    ['date', 'user_ids', 'cash', 'holdings_value', 'cost_basis', 'realized', 'active'])
+
+def round_cents(values):
+    """Round each value to cents with Python's round(), as trading.Account does.
+
+    np.round scales by 100 before rounding, so it breaks some half-cent ties
+    the other way.
+    """
+    return np.array([round(v, 2) for v in values.tolist()], dtype=np.float64)
+
+class Ledger(object):
+    """Cash and positions for every user, built up by applying trades.
+
+    Positions are stored sparsely: one slot per (user, stock) pair that has
+    ever been traded, in numpy arrays that grow by doubling. Each position
+    keeps its average purchase price the way trading.Account does, so sells
+    realize P&L against it.
+    """
+    def __init__(self, user_ids, stock_names, starting_cash=STARTING_CASH):
+        self.user_ids = np.asarray(user_ids, dtype=np.int64)
+        self.user_index = dict((u, i) for i, u in enumerate(user_ids))
+        self.stock_names = list(stock_names)
+        self.stock_index = dict((s, i) for i, s in enumerate(stock_names))
+        self.cash = np.full(len(user_ids), starting_cash, dtype=np.float64)
+        # A user is active from their first trade on
+        self.active = np.zeros(len(user_ids), dtype=bool)
+        self.realized = np.zeros(len(user_ids), dtype=np.float64)
+        self.prices = np.full(len(stock_names), np.nan)
+        self._slots = {}
+        self.position_users = np.zeros(1024, dtype=np.int64)
+        self.position_stocks = np.zeros(1024, dtype=np.int64)
+        self.position_shares = np.zeros(1024, dtype=np.float64)
+        self.position_prices = np.zeros(1024, dtype=np.float64)
+
+    def _slot(self, user, stock):
+        slot = self._slots.get((user, stock))
+        if slot is None:
+            slot = len(self._slots)
+            if slot == len(self.position_users):
+                size = 2 * slot
+                self.position_users = np.resize(self.position_users, size)
+                self.position_stocks = np.resize(self.position_stocks, size)
+                self.position_shares = np.resize(self.position_shares, size)
+                self.position_shares[slot:] = 0
+                self.position_prices = np.resize(self.position_prices, size)
+                self.position_prices[slot:] = 0
+            self.position_users[slot] = user
+            self.position_stocks[slot] = stock
+            self._slots[(user, stock)] = slot
+        return slot
+
+    def apply(self, trades, reprice=None):
+        """Apply (user_id, team, shares, price, buy_or_sell) tuples in order.
+
+        `reprice` maps an array of trade prices to the prices to use instead.
+        """
+        users, stocks, slots, share_deltas, prices, rounds = [], [], [], [], [], []
+        seen = {}
+        for user_id, team, shares, price, buy_or_sell in trades:
+            user = self.user_index.get(user_id)
+            stock = self.stock_index.get(team)
+            if user is None or stock is None:
+                continue
+            slot = self._slot(user, stock)
+            users.append(user)
+            stocks.append(stock)
+            slots.append(slot)
+            share_deltas.append(-shares if buy_or_sell == 'sell' else shares)
+            prices.append(price)
+            # A position traded more than once in the batch is updated in
+            # rounds, its nth trade in round n, so its trades stay in order
+            rounds.append(seen.get(slot, 0))
+            seen[slot] = rounds[-1] + 1
+        if not users:
+            return
+        users = np.asarray(users, dtype=np.int64)
+        stocks = np.asarray(stocks, dtype=np.int64)
+        slots = np.asarray(slots, dtype=np.int64)
+        share_deltas = np.asarray(share_deltas, dtype=np.float64)
+        prices = np.asarray(prices, dtype=np.float64)
+        if reprice is not None:
+            prices = reprice(prices)
+        np.add.at(self.cash, users, -round_cents(share_deltas * prices))
+        self.active[users] = True
+        # Value a team traded before its first price snapshot at the trade
+        # price
+        unpriced = np.isnan(self.prices[stocks])
+        self.prices[stocks[unpriced]] = prices[unpriced]
+        rounds = np.asarray(rounds)
+        for n in range(rounds.max() + 1):
+            batch = rounds == n
+            self._trade(users[batch], slots[batch], share_deltas[batch], prices[batch])
+
+    def _trade(self, users, slots, shares, prices):
+        # Each slot appears at most once here
+        held = self.position_shares[slots]
+        average = self.position_prices[slots]
+        sells = shares < 0
+        np.add.at(self.realized, users[sells],
+                  -shares[sells] * (prices[sells] - average[sells]))
+        total = held + shares
+        buys = ~sells
+        adding = buys & (held > 0)
+        self.position_prices[slots[buys]] = prices[buys]
+        self.position_prices[slots[adding]] = round_cents(
+            (average[adding] * held[adding] + prices[adding] * shares[adding])
+            / total[adding])
+        self.position_shares[slots] = total
+
+    def set_prices(self, prices, reprice=None):
+        """Update prices from (team, price) pairs; other teams keep theirs."""
+        stocks, values = [], []
+        for team, price in prices:
+            stock = self.stock_index.get(team)
+            if stock is not None:
+                stocks.append(stock)
+                values.append(price)
+        values = np.asarray(values, dtype=np.float64)
+        if reprice is not None and len(values):
+            values = reprice(values)
+        self.prices[np.asarray(stocks, dtype=np.int64)] = values
+
+    def holdings_value(self, prices=None):
+        if prices is None:
+            prices = self.prices
+        n = len(self._slots)
+        weights = self.position_shares[:n] * \
+            np.nan_to_num(prices)[self.position_stocks[:n]]
+        return np.bincount(self.position_users[:n], weights=weights,
+                           minlength=len(self.user_ids))
+
+    def cost_basis(self):
+        """What each user paid for the shares they hold, at average prices."""
+        n = len(self._slots)
+        return np.bincount(
+            self.position_users[:n],
+            weights=self.position_shares[:n] * self.position_prices[:n],
+            minlength=len(self.user_ids))
+
+def new_ledger():
+    user_ids = [u for u, in db.session.query(User.id).order_by(User.id)]
+    names = set(s for s, in db.session.query(Stock.name))
+    names.update(s for s, in db.session.query(StockPriceHistory.name.distinct()))
+    names.update(s for s, in db.session.query(Transaction.team.distinct()))
+    return Ledger(user_ids, sorted(names))
+
+def replay(ledger=None, batch_size=10000, reprice=None):
+    """Replay the trade ledger against every StockPriceHistory date.
+
+    Trades and prices are both streamed in date order and merged, so each is
+    read once. Yields a DailyState per price date with the cash, holdings
+    value, cost basis and realized P&L of every user at the end of that day.
+    `reprice` maps an array of prices to what a different pricing formula
+    would have made them; it is applied to trade and snapshot prices alike.
+    """
+    if ledger is None:
+        ledger = new_ledger()
+    trades = db.session.query(
+            Transaction.timestamp, Transaction.user_id, Transaction.team,
+            Transaction.shares, Transaction.price, Transaction.buy_or_sell)\
+        .order_by(Transaction.timestamp, Transaction.id)\
+        .yield_per(batch_size)
+    trades = iter(trades)
+    pending = next(trades, None)
+    prices = db.session.query(
+            StockPriceHistory.date, StockPriceHistory.name,
+            StockPriceHistory.price)\
+        .order_by(StockPriceHistory.date)\
+        .yield_per(batch_size)
+    for day, rows in groupby(prices, key=lambda r: r[0]):
+        todays_trades = []
+        while pending is not None and pending[0].date() <= day:
+            todays_trades.append(pending[1:])
+            pending = next(trades, None)
+        ledger.apply(todays_trades, reprice)
+        ledger.set_prices(((name, price) for _, name, price in rows), reprice)
+        yield DailyState(day, ledger.user_ids, ledger.cash.copy(),
+                         ledger.holdings_value(), ledger.cost_basis(),
+                         ledger.realized.copy(), ledger.active.copy())
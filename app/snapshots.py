@@ -0,0 +1,56 @@
+import numpy as np
+from app import db
+from app.models import PortfolioSnapshot, Transaction
+from app.replay import replay
+from app.valuation import Market
+
+def _write(day, rows):
+    db.session.query(PortfolioSnapshot)\
+        .filter(PortfolioSnapshot.date == day)\
+        .delete(synchronize_session=False)
+    if rows:
+        db.session.execute(PortfolioSnapshot.__table__.insert(), rows)
+
+def write_snapshots(day):
+    """Snapshot every portfolio at current prices for a price date.
+
+    As in backfill(), only users who have made a trade get a snapshot, so a
+    history is the same whichever way it was built.
+    """
+    valuation = Market.load().value()
+    traders = [u for u, in db.session.query(Transaction.user_id.distinct())]
+    active = np.isin(valuation.market.user_ids, traders)
+    rows = [
+        {'user_id': user_id, 'date': day, 'value': value, 'cash': cash}
+        for user_id, value, cash in zip(
+            valuation.market.user_ids[active].tolist(),
+            valuation.values[active].round(2).tolist(),
+            valuation.market.cash[active].round(2).tolist())
+    ]
+    _write(day, rows)
+    db.session.commit()
+    return len(rows)
+
+def backfill(start=None, end=None):
+    """Rebuild snapshots by replaying every trade against price history.
+
+    Users get snapshots from the day of their first trade. Returns the
+    number of days and snapshots written.
+    """
+    days = written = 0
+    for state in replay():
+        if (start and state.date < start) or (end and state.date > end):
+            continue
+        active = state.active
+        values = (state.cash + state.holdings_value)[active].round(2)
+        rows = [
+            {'user_id': user_id, 'date': state.date, 'value': value, 'cash': cash}
+            for user_id, value, cash in zip(
+                state.user_ids[active].tolist(), values.tolist(),
+                state.cash[active].round(2).tolist())
+        ]
+        _write(state.date, rows)
+        days += 1
+        written += len(rows)
+    db.session.commit()
+    return days, written
@@ -0,0 +1,250 @@
+import random
+import time
+from collections import namedtuple
+from datetime import datetime
+from sqlalchemy import and_, bindparam, select
+from sqlalchemy.exc import IntegrityError, OperationalError
+from app import db
+from app.analytics import record_trades
+from app.models import User, Holding, Stock, Transaction, DataVersion
+
+OrderResult = namedtuple('OrderResult',
+    ['team', 'shares', 'buy_or_sell', 'ok', 'price', 'error'])
+HeldShares = namedtuple('HeldShares',
+    ['id', 'user_id', 'stock', 'shares', 'purchase_price'])
+
+# Keeps IN lists under SQLite's bound parameter limit
+CHUNK_SIZE = 500
+
+class TradeError(Exception):
+    """A trade that can't be made, with a message for the user."""
+    pass
+
+class TradeConflict(Exception):
+    """Another request changed the same rows first."""
+    pass
+
+def market_is_open(now=None):
+    now = now or datetime.utcnow()
+    est = now.hour - 5
+    return 8 <= est <= 18
+
+def _chunks(items, size=CHUNK_SIZE):
+    items = list(items)
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+class Account(object):
+    """A user's cash and positions while a batch of orders is applied."""
+    def __init__(self, user_id, cash, holdings):
+        self.user_id = user_id
+        self.start_cash = self.cash = cash
+        # The holdings as read, by stock, and a working [shares, purchase
+        # price] copy of each that orders change
+        self.holdings = holdings
+        self.positions = dict(
+            (stock, [h.shares, h.purchase_price]) for stock, h in holdings.items())
+        self.transactions = []
+
+    def apply(self, team, shares, buy_or_sell, price, timestamp):
+        try:
+            if price is None:
+                raise TradeError('That team is not on the exchange.')
+            if not isinstance(shares, int) or isinstance(shares, bool) or shares <= 0:
+                raise TradeError('You must trade at least one share.')
+            total = round(shares * price, 2)
+            position = self.positions.get(team)
+            if buy_or_sell == "buy":
+                if self.cash < total:
+                    raise TradeError('You cannot afford this many shares.')
+                self.cash = round(self.cash - total, 2)
+                if not position or position[0] == 0:
+                    self.positions[team] = [shares, price]
+                else:
+                    total_shares = position[0] + shares
+                    position[1] = round((
+                        (position[1] * position[0]) +
+                        (price * shares)) / total_shares, 2)
+                    position[0] = total_shares
+            elif buy_or_sell == "sell":
+                if not position or position[0] == 0:
+                    raise TradeError('You do not own this team.')
+                if shares > position[0]:
+                    raise TradeError('You do not own enough of this team.')
+                self.cash = round(self.cash + total, 2)
+                position[0] -= shares
+            else:
+                raise TradeError('Trades must be a buy or a sell.')
+        except TradeError as e:
+            return OrderResult(team, shares, buy_or_sell, False, price, str(e))
+        self.transactions.append({
+            'team': team,
+            'price': price,
+            'shares': shares,
+            'user_id': self.user_id,
+            'timestamp': timestamp,
+            'buy_or_sell': buy_or_sell
+        })
+        return OrderResult(team, shares, buy_or_sell, True, price, None)
+
+def load_accounts(user_ids, teams=None):
+    """Accounts for the users, with their holdings (in `teams` if given)."""
+    accounts = {}
+    holdings_query = select([
+            Holding.id, Holding.user_id, Holding.stock,
+            Holding.shares, Holding.purchase_price])\
+        .where(Holding.user_id.in_(bindparam('user_ids', expanding=True)))
+    if teams is not None:
+        holdings_query = holdings_query.where(Holding.stock.in_(list(teams)))
+    users_query = select([User.id, User.cash])\
+        .where(User.id.in_(bindparam('user_ids', expanding=True)))
+    for chunk in _chunks(user_ids):
+        holdings = {}
+        for row in db.session.execute(holdings_query, {'user_ids': chunk}).fetchall():
+            # Plain tuples: attribute lookups on result rows are slow
+            h = HeldShares._make(row)
+            holdings.setdefault(h.user_id, {})[h.stock] = h
+        for user_id, cash in db.session.execute(users_query, {'user_ids': chunk}).fetchall():
+            accounts[user_id] = Account(user_id, cash, holdings.get(user_id, {}))
+    return accounts
+
+def swap_all(statement, params):
+    """Run a conditional write per row, or raise TradeConflict if any missed."""
+    if not params:
+        return
+    if db.engine.dialect.supports_sane_multi_rowcount:
+        if db.session.execute(statement, params).rowcount != len(params):
+            raise TradeConflict()
+    else:
+        for p in params:
+            if db.session.execute(statement, p).rowcount != 1:
+                raise TradeConflict()
+
+def save_accounts(accounts):
+    """Write the accounts' changes with conditional bulk updates.
+
+    Cash and holdings are only updated if they still hold the values that
+    were read, so a concurrent trade raises TradeConflict instead of being
+    overwritten.
+    """
+    users = User.__table__
+    holdings = Holding.__table__
+    cash, inserts, updates, deletes, transactions = [], [], [], [], []
+    cost_changes = {}
+    for account in accounts:
+        if not account.transactions:
+            continue
+        transactions.extend(account.transactions)
+        cash.append({'b_id': account.user_id, 'b_old': account.start_cash,
+                     'b_new': account.cash})
+        for team in set(t['team'] for t in account.transactions):
+            holding = account.holdings.get(team)
+            shares, purchase_price = account.positions[team]
+            cost_changes[team] = cost_changes.get(team, 0.0) + shares * purchase_price
+            if holding is not None:
+                cost_changes[team] -= holding.shares * holding.purchase_price
+            if holding is None:
+                # If this is a new holding, create it
+                if shares:
+                    inserts.append({'user_id': account.user_id, 'stock': team,
+                                    'shares': shares, 'purchase_price': purchase_price})
+            elif shares == 0:
+                deletes.append({'b_id': holding.id, 'b_old': holding.shares})
+            else:
+                updates.append({'b_id': holding.id, 'b_old': holding.shares,
+                                'b_shares': shares, 'b_price': purchase_price})
+    swap_all(users.update()
+        .where(and_(users.c.id == bindparam('b_id'), users.c.cash == bindparam('b_old')))
+        .values(cash=bindparam('b_new')), cash)
+    swap_all(holdings.update()
+        .where(and_(holdings.c.id == bindparam('b_id'), holdings.c.shares == bindparam('b_old')))
+        .values(shares=bindparam('b_shares'), purchase_price=bindparam('b_price')), updates)
+    swap_all(holdings.delete()
+        .where(and_(holdings.c.id == bindparam('b_id'), holdings.c.shares == bindparam('b_old'))),
+        deletes)
+    if inserts:
+        db.session.execute(holdings.insert(), inserts)
+    if transactions:
+        db.session.execute(Transaction.__table__.insert(), transactions)
+        record_trades(transactions, cost_changes)
+        # Tells cached pages that depend on these trades they are stale
+        DataVersion.bump('trades', *('trades:' + team for team in cost_changes))
+
+# Postgres serialization failure, deadlock and lock not available
+CONTENTION_CODES = ('40001', '40P01', '55P03')
+
+def is_contention(error):
+    """Whether an OperationalError is another transaction holding a lock."""
+    if getattr(error.orig, 'pgcode', None) in CONTENTION_CODES:
+        return True
+    message = str(error.orig).lower()
+    return 'database is locked' in message or 'database table is locked' in message
+
+def with_retries(fn, retries=5, backoff=0.01):
+    """Run fn() and commit, retrying with jittered backoff on conflicts."""
+    for attempt in range(retries):
+        try:
+            result = fn()
+            db.session.commit()
+            return result
+        except (TradeConflict, IntegrityError, OperationalError) as e:
+            # IntegrityError: a concurrent first buy created the holding.
+            # OperationalError: SQLite couldn't get the write lock, or
+            # Postgres rolled back a conflicting transaction. Anything else
+            # (a missing table, a lost connection) isn't contention.
+            db.session.rollback()
+            if isinstance(e, OperationalError) and not is_contention(e):
+                raise
+            time.sleep(backoff * (2 ** attempt) * random.random())
+    raise TradeError('The exchange is busy. Please try your trade again.')
+
+def _execute(user_id, orders):
+    # Anything but a name (a list, say) can't be a team, and isn't hashable
+    teams = set(team for team, _, _ in orders if isinstance(team, str))
+    prices = dict(db.session.query(Stock.name, Stock.price)
+                  .filter(Stock.name.in_(teams)))
+    account = load_accounts([user_id], teams)[user_id]
+    now = datetime.utcnow()
+    results = [account.apply(team, shares, buy_or_sell,
+                             prices.get(team) if isinstance(team, str) else None, now)
+               for team, shares, buy_or_sell in orders]
+    save_accounts([account])
+    return results
+
+def execute_orders(user_id, orders, **kwargs):
+    """Run a batch of (team, shares, buy_or_sell) orders for one user.
+
+    Orders are checked in turn against one read of the user's cash,
+    holdings and the current prices; the ones that pass are written in a
+    single database transaction. A conflicting batch is rolled back and
+    retried. Returns an OrderResult per order.
+    """
+    return with_retries(lambda: _execute(user_id, orders), **kwargs)
+
+def execute_trade(user_id, stock, shares, buy_or_sell, **kwargs):
+    """Buy or sell shares at the current price, or raise TradeError."""
+    result = execute_orders(user_id, [(stock, shares, buy_or_sell)], **kwargs)[0]
+    if not result.ok:
+        raise TradeError(result.error)
+    return result
+
+def execute_bulk(orders):
+    """Run (user_id, team, shares, buy_or_sell) orders for many users at once.
+
+    Same rules as execute_orders, loading every account in a few queries and
+    writing all the changes with bulk conditional updates. Call it through
+    with_retries(). Returns an OrderResult per order.
+    """
+    prices = dict(db.session.query(Stock.name, Stock.price))
+    accounts = load_accounts(set(user_id for user_id, _, _, _ in orders))
+    now = datetime.utcnow()
+    results = []
+    for user_id, team, shares, buy_or_sell in orders:
+        account = accounts.get(user_id)
+        if account is None:
+            results.append(OrderResult(team, shares, buy_or_sell, False, None,
+                                       'That user no longer exists.'))
+            continue
+        results.append(account.apply(team, shares, buy_or_sell, prices.get(team), now))
+    save_accounts(accounts.values())
+    return results
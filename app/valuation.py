@@ -0,0 +1,91 @@
+from threading import Lock
+import numpy as np
+from flask import current_app
+from sqlalchemy import func
+from app import db
+from app.models import User, Holding, Stock, Transaction, StockPriceHistory
+
+def data_markers():
+    """The newest price, trade and user ids.
+
+    New prices from update_stocks.py, trades and sign ups all show up here,
+    including ones written by other processes.
+    """
+    return db.session.query(
+        db.session.query(func.max(StockPriceHistory.id)).as_scalar(),
+        db.session.query(func.max(Transaction.id)).as_scalar(),
+        db.session.query(func.max(User.id)).as_scalar()).one()
+
+class Market(object):
+    """Every holding as a users x stocks share matrix and a price vector.
+
+    The matrix is sparse (most users own a handful of teams), so it is kept in
+    coordinate form: one entry per holding with its user index, stock index
+    and shares. Matrix-vector products are np.bincount calls.
+    """
+    def __init__(self, user_ids, usernames, cash, stock_names, prices,
+                 holding_users, holding_stocks, shares):
+        self.user_ids = np.asarray(user_ids, dtype=np.int64)
+        self.usernames = list(usernames)
+        self.cash = np.asarray(cash, dtype=np.float64)
+        self.stock_names = list(stock_names)
+        self.prices = np.asarray(prices, dtype=np.float64)
+        self.holding_users = np.asarray(holding_users, dtype=np.int64)
+        self.holding_stocks = np.asarray(holding_stocks, dtype=np.int64)
+        self.shares = np.asarray(shares, dtype=np.float64)
+
+    @classmethod
+    def load(cls):
+        """Read users, stocks and holdings with one flat query each."""
+        users = db.session.query(User.id, User.username, User.cash)\
+            .order_by(User.id).all()
+        stocks = db.session.query(Stock.name, Stock.price)\
+            .order_by(Stock.name).all()
+        user_index = dict((u.id, i) for i, u in enumerate(users))
+        stock_index = dict((s.name, i) for i, s in enumerate(stocks))
+        holding_users, holding_stocks, shares = [], [], []
+        rows = db.session.query(Holding.user_id, Holding.stock, Holding.shares)
+        for user_id, stock, count in rows:
+            if user_id not in user_index or stock not in stock_index:
+                continue
+            holding_users.append(user_index[user_id])
+            holding_stocks.append(stock_index[stock])
+            shares.append(count or 0)
+        return cls(
+            [u.id for u in users], [u.username for u in users],
+            [u.cash or 0 for u in users],
+            [s.name for s in stocks], [s.price or 0 for s in stocks],
+            holding_users, holding_stocks, shares)
+
+    def value(self):
+        """Value every portfolio at current prices."""
+        holdings_value = np.bincount(
+            self.holding_users,
+            weights=self.shares * self.prices[self.holding_stocks],
+            minlength=len(self.user_ids))
+        return Valuation(self, holdings_value)
+
+class Valuation(object):
+    """The value of every portfolio at current prices."""
+    def __init__(self, market, holdings_value):
+        self.market = market
+        self.holdings_value = holdings_value
+        self.values = market.cash + holdings_value
+
+    def rows(self):
+        """(user_id, username, value) for every user."""
+        values = np.round(self.values, 2).tolist()
+        return list(zip(self.market.user_ids.tolist(), self.market.usernames, values))
+
+_cache_lock = Lock()
+
+def current_valuation():
+    """The whole market valued at current prices, reloaded when data changes."""
+    markers = data_markers()
+    with _cache_lock:
+        cache = current_app.extensions.setdefault(
+            'valuation', {'markers': None, 'valuation': None})
+        if cache['markers'] != markers:
+            cache['valuation'] = Market.load().value()
+            cache['markers'] = markers
+        return cache['valuation']
@@ -0,0 +1,74 @@
+"""Rebuilding a season's price history from an archive of price CSVs.
+
+Writes a synthetic price_csvs/ archive (several scrapes a day, each with
+every KenPom column), then times parsing it in one process and in a pool
+of worker processes, and bulk-loading the result. Loading it a second
+time must be a no-op.
+
+Run from the project root with: python -m benchmarks.bench_backfill
+"""
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+db_dir = tempfile.mkdtemp()
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(db_dir, 'bench.db')
+
+import pandas as pd
+from app import create_app, db
+from app.models import Stock, StockPriceHistory
+from price_sources import DirectorySource
+from update_stocks import insert_snapshots
+
+app = create_app()
+
+DAYS = 150
+SCRAPES_PER_DAY = 4
+TEAMS = 350
+COLUMNS = [
+    "Rk", "Team", "Conf", "W-L", "AdjEM", "AdjO", "AdjORnk", "AdjD", "AdjDRnk",
+    "AdjT", "AdjTRnk", "Luck", "LunkRnk", "SOSAdjEM", "SOSAdjEMRnk", "OppO",
+    "OppORnk", "OppD", "OppDRnk", "NCSOSAdjEM", "NCSOSAdjEMRnk", "AdjEM_num", "price"
+]
+
+def write_archive(path):
+    start = datetime(2026, 11, 1, 12)
+    teams = ['Team {}'.format(i) for i in range(TEAMS)]
+    for day in range(DAYS):
+        for scrape in range(SCRAPES_PER_DAY):
+            rows = []
+            for rank, team in enumerate(teams, 1):
+                em = round(random.uniform(-20, 20), 2)
+                rows.append([rank, team, 'MVC', '10-5', '{:+.2f}'.format(em)] +
+                            [round(random.uniform(0, 120), 1) for _ in range(16)] +
+                            [em, em + 20.1])
+            stamp = start + timedelta(days=day, hours=3 * scrape)
+            pd.DataFrame(rows, columns=COLUMNS).to_csv(
+                os.path.join(path, 'prices_{}'.format(stamp)), index=None)
+
+def main():
+    archive = tempfile.mkdtemp()
+    write_archive(archive)
+    with app.app_context():
+        db.create_all()
+        db.session.execute(Stock.__table__.insert(), [
+            {'name': 'Team {}'.format(i), 'price': 1.0} for i in range(TEAMS)])
+        db.session.commit()
+    files = DAYS * SCRAPES_PER_DAY
+    for workers in [1, os.cpu_count() or 1]:
+        start = time.perf_counter()
+        snapshots = DirectorySource(archive, workers).snapshots()
+        elapsed = time.perf_counter() - start
+        print('parse {:>4,d} files, {:>2d} worker(s) {:6.2f}s'.format(files, workers, elapsed))
+    for label in ['load', 'reload']:
+        start = time.perf_counter()
+        result = insert_snapshots(snapshots)
+        print('{:<6} {:>8,d} prices loaded, {:>8,d} skipped {:6.2f}s'.format(
+            label, result['loaded'], result['skipped'], time.perf_counter() - start))
+    with app.app_context():
+        assert StockPriceHistory.query.count() == DAYS * TEAMS
+
+if __name__ == '__main__':
+    main()
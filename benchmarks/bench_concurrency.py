@@ -0,0 +1,126 @@
+"""Page latency while the price updater writes.
+
+Reader processes, standing in for web workers, request the main pages
+through the Flask test client while a writer keeps loading price history
+with update_stocks, which holds the write lock for the whole load. The run
+is made twice, each in a fresh process and database: once with the old
+settings (rollback journal, synchronous=FULL, a new connection per request)
+and once with the defaults from config.py (WAL, synchronous=NORMAL, pooled
+connections). Failed requests are ones that hit "database is locked".
+
+Run from the project root with: python -m benchmarks.bench_concurrency
+"""
+import argparse
+import multiprocessing
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+
+SETTINGS = [
+    ('rollback journal', {'SQLITE_JOURNAL_MODE': 'DELETE', 'SQLITE_SYNCHRONOUS': 'FULL',
+                          'DATABASE_POOL_SIZE': '0'}),
+    ('WAL', {}),
+]
+
+parser = argparse.ArgumentParser(description='Benchmark reads during price updates.')
+parser.add_argument('--seconds', type=float, default=10)
+parser.add_argument('--readers', type=int, default=4)
+parser.add_argument('--days-per-load', type=int, default=10,
+                    help='Price dates loaded per write transaction')
+parser.add_argument('--run', action='store_true', help=argparse.SUPPRESS)
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(int(len(values) * p / 100), len(values) - 1)] if values else 0
+
+def write_prices(teams, days_per_load, stop, loads):
+    import update_stocks
+    day = date.today()
+    while not stop.is_set():
+        snapshots = []
+        for _ in range(days_per_load):
+            day += timedelta(days=1)
+            snapshots.append((day.isoformat(), [(t, float(day.day)) for t in teams]))
+        start = time.perf_counter()
+        update_stocks.insert_snapshots(snapshots)
+        loads.append(time.perf_counter() - start)
+
+def read_pages(user_id, urls, seconds, results):
+    from sqlalchemy.exc import OperationalError
+    from app import create_app
+    # A new app, so no connection opened before the fork is shared
+    app = create_app()
+    app.config['PROPAGATE_EXCEPTIONS'] = True
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = str(user_id)
+    latencies, errors, i = [], 0, 0
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        url = urls[i % len(urls)]
+        i += 1
+        start = time.perf_counter()
+        try:
+            status = client.get(url).status_code
+        except OperationalError:
+            status = 500
+        if status == 200:
+            latencies.append(time.perf_counter() - start)
+        else:
+            errors += 1
+    results.put((latencies, errors))
+
+def run(seconds, readers, days_per_load):
+    from app import create_app, db
+    from app.models import User, Stock
+    from benchmarks.seed import seed
+    app = create_app()
+    app.config['PROPAGATE_EXCEPTIONS'] = True
+    with app.app_context():
+        seed(users=2000, teams=350, transactions=100000, days=60)
+        user_ids = [u for u, in db.session.query(User.id).limit(readers)]
+        teams = [s for s, in db.session.query(Stock.name)]
+    urls = ['/leaders', '/analytics', '/team/' + teams[0], '/user/user1', '/transactions']
+    results = multiprocessing.Queue()
+    processes = [multiprocessing.Process(target=read_pages, args=(u, urls, seconds, results))
+                 for u in user_ids]
+    for process in processes:
+        process.start()
+    loads, stop = [], threading.Event()
+    writer = threading.Thread(target=write_prices, args=(teams, days_per_load, stop, loads))
+    writer.start()
+    reads, errors = [], 0
+    for _ in processes:
+        latencies, failed = results.get()
+        reads.extend(l * 1000 for l in latencies)
+        errors += failed
+    stop.set()
+    writer.join()
+    for process in processes:
+        process.join()
+    print('{:>6,d} reads/s, p50 {:6.1f}ms, p99 {:7.1f}ms, max {:7.1f}ms, {:>3,d} failed; '
+          '{:>3,d} price loads, mean {:6.1f}ms'.format(
+              int(len(reads) / seconds), percentile(reads, 50), percentile(reads, 99),
+              max(reads or [0]), errors, len(loads), 1000 * sum(loads) / max(len(loads), 1)))
+
+def main():
+    args = parser.parse_args()
+    if args.run:
+        run(args.seconds, args.readers, args.days_per_load)
+        return
+    for label, settings in SETTINGS:
+        env = dict(os.environ, **settings)
+        env['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench.db')
+        sys.stdout.write('{:<17} '.format(label))
+        sys.stdout.flush()
+        subprocess.check_call([sys.executable, '-m', 'benchmarks.bench_concurrency', '--run',
+                               '--seconds', str(args.seconds), '--readers', str(args.readers),
+                               '--days-per-load', str(args.days_per_load)],
+                              env=env)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,124 @@
+"""Threads and SMTP connections used to send a burst of email.
+
+Sends the same burst twice: once with a thread and connection per message,
+as send_email used to, and once through the mail queue. Both go to a small
+SMTP sink started here, which refuses every FLAKY-th message once so the
+queue's retries get exercised. To use a real stand-in server instead, start
+one (e.g. `python -m aiosmtpd -n -l localhost:8025`) and set MAIL_SERVER and
+MAIL_PORT.
+
+Run from the project root with: python -m benchmarks.bench_email
+"""
+import os
+import socketserver
+import threading
+import time
+
+MESSAGES = 500
+FLAKY = 50
+
+class SMTPSink(socketserver.StreamRequestHandler):
+    """Just enough SMTP to accept mail and count it."""
+    def reply(self, line):
+        self.wfile.write((line + '\r\n').encode())
+
+    def handle(self):
+        stats = self.server.stats
+        with self.server.lock:
+            stats['connections'] += 1
+        self.reply('220 sink ready')
+        while True:
+            line = self.rfile.readline().decode().strip()
+            command = line[:4].upper()
+            if not line or command == 'QUIT':
+                self.reply('221 bye')
+                return
+            if command in ('EHLO', 'HELO'):
+                self.reply('250 sink')
+            elif command == 'DATA':
+                self.reply('354 go ahead')
+                while self.rfile.readline().rstrip(b'\r\n') != b'.':
+                    pass
+                with self.server.lock:
+                    stats['received'] += 1
+                    refuse = stats['received'] % FLAKY == 0 and not stats.get('refused_last')
+                    stats['refused_last'] = refuse
+                    if refuse:
+                        stats['refused'] += 1
+                        stats['received'] -= 1
+                self.reply('451 try again' if refuse else '250 queued')
+            else:
+                self.reply('250 ok')
+
+class SinkServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    request_queue_size = 1024
+
+sink = None
+if not os.environ.get('MAIL_SERVER'):
+    sink = SinkServer(('127.0.0.1', 0), SMTPSink)
+    sink.lock = threading.Lock()
+    sink.stats = {'connections': 0, 'received': 0, 'refused': 0}
+    threading.Thread(target=sink.serve_forever, daemon=True).start()
+    os.environ['MAIL_SERVER'] = '127.0.0.1'
+    os.environ['MAIL_PORT'] = str(sink.server_address[1])
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+os.environ.setdefault('MAIL_RETRY_BACKOFF', '0.01')
+
+from flask_mail import Message
+from app import create_app, mail
+from app.email import mail_queue
+
+app = create_app()
+
+def messages():
+    for i in range(MESSAGES):
+        msg = Message('Announcement', sender='admin@example.com',
+                      recipients=['user{}@example.com'.format(i)])
+        msg.body = 'Round two starts Thursday.'
+        yield msg
+
+def send_old(msg):
+    with app.app_context():
+        try:
+            mail.send(msg)
+        except Exception:
+            pass
+
+def thread_per_message():
+    threads, peak = [], 0
+    for msg in messages():
+        thread = threading.Thread(target=send_old, args=(msg,))
+        thread.start()
+        threads.append(thread)
+        peak = max(peak, threading.active_count())
+    for thread in threads:
+        thread.join()
+    return peak
+
+def queued():
+    peak = 0
+    for msg in messages():
+        mail_queue.put(msg, timeout=None)
+        peak = max(peak, threading.active_count())
+    mail_queue.join()
+    return peak
+
+def main():
+    with app.app_context():
+        for label, run in [('thread per message', thread_per_message), ('mail queue', queued)]:
+            if sink:
+                sink.stats.update(connections=0, received=0, refused=0)
+            start = time.perf_counter()
+            peak = run()
+            elapsed = time.perf_counter() - start
+            line = '{:<19} {:>5,d} messages in {:6.2f}s, peak {:>4,d} threads'.format(
+                label, MESSAGES, elapsed, peak)
+            if sink:
+                line += ', {:>4,d} connections, {:>4,d} delivered, {:>3,d} refused'.format(
+                    sink.stats['connections'], sink.stats['received'], sink.stats['refused'])
+            print(line)
+        print('mail queue metrics:', mail_queue.metrics())
+
+if __name__ == '__main__':
+    main()
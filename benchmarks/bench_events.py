@@ -0,0 +1,173 @@
+"""Fan-out of live price and trade events to many subscribers.
+
+Opens --subscribers event streams through the Flask test client, each read
+by its own thread, plus a few that never read. Trades are then made in this
+process and price snapshots loaded by update_stocks in another one, and
+every stream's events are timed from the commit to their arrival on the
+system-wide monotonic clock. Slow subscribers should be dropped without
+holding anyone else up. The run exits non-zero if any reading stream
+misses an event or a slow subscriber is not dropped.
+
+For comparison it reports the queries that the same clients would run by
+refreshing /team/<teamname> every --poll-seconds instead.
+
+Run from the project root with: python -m benchmarks.bench_events
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench.db')
+os.environ.setdefault('EVENTS_QUEUE_SIZE', '50')
+
+from sqlalchemy import event
+from app import create_app, db
+from app.main import forms
+from app.models import User, Stock
+from benchmarks.seed import seed
+
+app = create_app()
+broadcaster = app.extensions['broadcaster']
+
+parser = argparse.ArgumentParser(description='Benchmark live event fan-out.')
+parser.add_argument('--subscribers', type=int, default=500)
+parser.add_argument('--slow', type=int, default=5, help='Subscribers that never read')
+parser.add_argument('--trades', type=int, default=50)
+parser.add_argument('--price-loads', type=int, default=3)
+parser.add_argument('--poll-seconds', type=float, default=10,
+                    help='How often a client would otherwise refresh the page')
+
+LOAD_PRICES = '''
+import sys, time, update_stocks
+day, teams = sys.argv[1], sys.argv[2:]
+update_stocks.insert_snapshots([(day, [(t, float(len(t) + int(day[-2:]))) for t in teams])])
+print(time.monotonic())
+'''
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(int(len(values) * p / 100), len(values) - 1)] if values else 0
+
+def read_stream(client, received):
+    response = client.get('/events', buffered=False)
+    for chunk in response.response:
+        if chunk.startswith(b'event:'):
+            received.append((chunk.split(b'\n', 1)[0], time.monotonic()))
+
+def count_queries(client, url):
+    queries = [0]
+    def count(*args):
+        queries[0] += 1
+    engines = list(filter(None, [db.get_engine(app), db.read_engine(app)]))
+    for engine in engines:
+        event.listen(engine, 'before_cursor_execute', count)
+    try:
+        # Without an If-None-Match, as a page refresh after a change would be
+        client.get(url)
+    finally:
+        for engine in engines:
+            event.remove(engine, 'before_cursor_execute', count)
+    return queries[0]
+
+def main():
+    args = parser.parse_args()
+    forms.market_is_open = lambda: True
+    app.config['WTF_CSRF_ENABLED'] = False
+    broadcaster.interval = 0.1
+    with app.app_context():
+        seed(users=max(args.subscribers, 100), teams=50, transactions=5000, days=10)
+        user_ids = [u for u, in db.session.query(User.id).limit(args.subscribers)]
+        teams = [s for s, in db.session.query(Stock.name)]
+        trader_id = db.session.query(User.id).order_by(User.cash.desc()).first()[0]
+
+    clients = []
+    for user_id in user_ids:
+        client = app.test_client()
+        with client.session_transaction() as session:
+            session['_user_id'] = str(user_id)
+        clients.append(client)
+    with app.app_context():
+        page_queries = count_queries(clients[0], '/team/' + teams[0])
+
+    streams = []
+    for client in clients:
+        received = []
+        thread = threading.Thread(target=read_stream, args=(client, received))
+        thread.daemon = True
+        thread.start()
+        streams.append(received)
+    slow = [broadcaster.subscribe() for _ in range(args.slow)]
+    while broadcaster.metrics()['subscribers'] < len(clients) + len(slow):
+        time.sleep(0.05)
+
+    poll_queries = [0]
+    def count(conn, cursor, statement, *args):
+        if threading.current_thread().name == 'events':
+            poll_queries[0] += 1
+    event.listen(db.get_engine(app), 'before_cursor_execute', count)
+    started = time.perf_counter()
+    sent = []
+    trader = app.test_client()
+    with trader.session_transaction() as session:
+        session['_user_id'] = str(trader_id)
+    for i in range(args.trades):
+        # Buy a share and sell it back, so the trader never runs out of cash
+        trader.post('/transaction', data={'stock': teams[i // 2 % len(teams)], 'shares': 1,
+                                          'buy_or_sell': 'sell' if i % 2 else 'buy'})
+        sent.append(time.monotonic())
+    for i in range(args.price_loads):
+        published = broadcaster.metrics()['published']
+        # The monotonic clock is shared between processes
+        committed = float(subprocess.check_output([sys.executable, '-c', LOAD_PRICES,
+                                                   '2099-01-{:02d}'.format(i + 1)] + teams))
+        sent.extend([committed] * len(teams))
+        # Price events carry the latest price, so two loads seen in one poll
+        # would be sent as one; wait for this one to go out
+        deadline = time.perf_counter() + 10
+        while time.perf_counter() < deadline and \
+                broadcaster.metrics()['published'] < published + len(teams):
+            time.sleep(0.01)
+    expected = len(sent)
+    deadline = time.perf_counter() + 10
+    while time.perf_counter() < deadline and \
+            min(len(r) for r in streams) < expected:
+        time.sleep(0.05)
+    elapsed = time.perf_counter() - started
+    event.remove(db.get_engine(app), 'before_cursor_execute', count)
+
+    # Events arrive in the order they were sent, so the nth event a stream
+    # got is the nth one sent
+    latencies = [(at - sent[i]) * 1000 for received in streams
+                 for i, (_, at) in enumerate(received[:expected])]
+    complete = sum(1 for r in streams if len(r) >= expected)
+    metrics = broadcaster.metrics()
+    print('{:,d} subscribers, {:,d} events each ({} trades, {} price loads) in {:.1f}s'.format(
+        len(streams), expected, args.trades, args.price_loads, elapsed))
+    print('{:,d} streams got every event; delivery p50 {:.1f}ms, p99 {:.1f}ms, max {:.1f}ms'.format(
+        complete, percentile(latencies, 50), percentile(latencies, 99), max(latencies or [0])))
+    print('{} of {} slow subscribers dropped'.format(sum(1 for s in slow if s.closed), len(slow)))
+    print('event poller: {:,d} queries ({:.1f}/s)'.format(
+        poll_queries[0], poll_queries[0] / elapsed))
+    print('refreshing /team every {:.0f}s instead: {:,d} queries/s'.format(
+        args.poll_seconds, int(len(streams) * page_queries / args.poll_seconds)))
+    print('broadcaster metrics:', metrics)
+    broadcaster.shutdown()
+    failures = []
+    if complete < len(streams):
+        failures.append('{:,d} of {:,d} streams missed events'.format(
+            len(streams) - complete, len(streams)))
+    # A slow subscriber only overflows once more events than its queue holds are sent
+    if expected > broadcaster.queue_size and not all(s.closed for s in slow):
+        failures.append('{} slow subscribers were not dropped'.format(
+            sum(1 for s in slow if not s.closed)))
+    for failure in failures:
+        print('FAIL ' + failure)
+    if failures:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+"""Write transactions caused by last_seen tracking under read traffic.
+
+Replays the same page views twice: once flushing after every request, as
+the old commit-per-request hook did, and once with the default batching.
+
+Run from the project root with: python -m benchmarks.bench_last_seen
+"""
+import os
+import random
+import tempfile
+import time
+
+db_dir = tempfile.mkdtemp()
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(db_dir, 'bench.db')
+
+from sqlalchemy import event
+from app import create_app, db
+from app.activity import activity
+from app.models import User
+
+app = create_app()
+
+USERS = 200
+REQUESTS = 5000
+
+def seed():
+    db.create_all()
+    db.session.execute(User.__table__.insert(), [
+        {'id': i, 'username': 'user{}'.format(i), 'email': 'user{}@example.com'.format(i),
+         'cash': 500.0} for i in range(1, USERS + 1)])
+    db.session.commit()
+
+def run(max_pending, interval):
+    activity.max_pending = max_pending
+    activity.interval = interval
+    counts = {'commits': 0, 'updates': 0}
+    def commit(conn):
+        counts['commits'] += 1
+    def execute(conn, cursor, statement, parameters, context, executemany):
+        if statement.startswith('UPDATE user'):
+            counts['updates'] += 1
+    event.listen(db.engine, 'commit', commit)
+    event.listen(db.engine, 'before_cursor_execute', execute)
+    client = app.test_client()
+    start = time.perf_counter()
+    for _ in range(REQUESTS):
+        with client.session_transaction() as session:
+            session['_user_id'] = str(random.randint(1, USERS))
+        client.get('/index')
+    activity.flush()
+    elapsed = time.perf_counter() - start
+    event.remove(db.engine, 'commit', commit)
+    event.remove(db.engine, 'before_cursor_execute', execute)
+    return counts, elapsed
+
+def main():
+    with app.app_context():
+        seed()
+        for label, max_pending, interval in [('every request', 1, 0),
+                                             ('batched', app.config['LAST_SEEN_MAX_PENDING'],
+                                              app.config['LAST_SEEN_FLUSH_INTERVAL'])]:
+            counts, elapsed = run(max_pending, interval)
+            print('{:<14} {:>6,d} requests: {:>5,d} write transactions, {:>5,d} UPDATE statements, {:.0f} req/sec'.format(
+                label, REQUESTS, counts['commits'], counts['updates'], REQUESTS / elapsed))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+"""Leaderboard latency from 100 to 100,000 users.
+
+Times the in-memory board (top 20, a user's neighbours and moving a user
+after a trade), then refresh() against a seeded database: the full load
+after a new price snapshot and the incremental update after a few trades.
+
+Run from the project root with: python -m benchmarks.bench_leaderboard
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+from datetime import date, datetime
+from timeit import timeit
+
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench.db')
+
+from app import create_app, db
+from app.leaderboard import Leaderboard
+from app.models import StockPriceHistory, Transaction, User
+from benchmarks.seed import seed, team_name
+
+SIZES = [100, 1000, 10000, 100000]
+REPEAT = 2000
+
+parser = argparse.ArgumentParser(description='Benchmark the leaderboard.')
+parser.add_argument('--users', type=int, default=20000, help='Users to seed for refresh()')
+parser.add_argument('--trades', type=int, default=20, help='Trades between incremental refreshes')
+parser.add_argument('--repeat', type=int, default=5)
+
+def build(n):
+    board = Leaderboard()
+    board.load([(i, 'user{}'.format(i), round(random.uniform(0, 2000), 2))
+                for i in range(1, n + 1)])
+    return board
+
+def in_memory():
+    print('{:>8} {:>12} {:>12} {:>12}'.format('users', 'top 20', 'around', 'trade'))
+    for n in SIZES:
+        board = build(n)
+        ids = [random.randint(1, n) for _ in range(REPEAT)]
+        it = iter(ids * 3)
+        top = timeit(lambda: board.top(20), number=REPEAT) / REPEAT
+        around = timeit(lambda: board.around(next(it)), number=REPEAT) / REPEAT
+        trade = timeit(
+            lambda: board.set(next(it), 'user', round(random.uniform(0, 2000), 2)),
+            number=REPEAT) / REPEAT
+        print('{:>8,d} {:>10.1f}us {:>10.1f}us {:>10.1f}us'.format(
+            n, top * 1e6, around * 1e6, trade * 1e6))
+
+def timed(board):
+    start = time.perf_counter()
+    board.refresh()
+    return (time.perf_counter() - start) * 1000
+
+def from_database(users, trades, repeat):
+    app = create_app()
+    with app.app_context():
+        seed(users=users, teams=350, transactions=users * 10, days=10)
+        board = Leaderboard()
+        loads, updates = [], []
+        for i in range(repeat):
+            # A new price snapshot: the whole board is reloaded
+            db.session.add(StockPriceHistory(name=team_name(0), date=date.today(),
+                                             price=random.uniform(1, 30)))
+            db.session.commit()
+            loads.append(timed(board))
+            # A few trades: only the traders are re-valued
+            for user_id in random.sample(range(1, users + 1), trades):
+                db.session.add(Transaction(timestamp=datetime.utcnow(), user_id=user_id,
+                                           team=team_name(0), shares=1, price=1.0,
+                                           buy_or_sell='buy'))
+                User.query.get(user_id).cash -= 1
+            db.session.commit()
+            updates.append(timed(board))
+        print('refresh() with {:,d} users: {:.1f}ms to load after a price snapshot, '
+              '{:.1f}ms after {} trades (medians of {})'.format(
+                  len(board), sorted(loads)[repeat // 2], sorted(updates)[repeat // 2],
+                  trades, repeat))
+
+def main():
+    args = parser.parse_args()
+    in_memory()
+    from_database(args.users, args.trades, args.repeat)
+
+if __name__ == '__main__':
+    main()
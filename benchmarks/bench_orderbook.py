@@ -0,0 +1,88 @@
+"""Limit order matching pass over tens of thousands of open orders.
+
+The run exits non-zero if the matching pass takes longer than --max-seconds.
+
+Run from the project root with: python -m benchmarks.bench_orderbook
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import bindparam
+
+db_dir = tempfile.mkdtemp()
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(db_dir, 'bench.db')
+
+from app import create_app, db
+from app.models import User, Holding, Stock, LimitOrder
+from app.orderbook import load_books, match_orders
+
+app = create_app()
+
+USERS = 5000
+STOCKS = 350
+ORDERS = 50000
+
+parser = argparse.ArgumentParser(description='Benchmark the limit order matching pass.')
+parser.add_argument('--max-seconds', type=float, default=1.0,
+                    help='Fail if the matching pass takes longer than this')
+
+def seed():
+    db.create_all()
+    prices = dict(('Team {}'.format(i), round(random.uniform(1, 40), 2)) for i in range(STOCKS))
+    db.session.execute(Stock.__table__.insert(),
+                       [{'name': n, 'price': p} for n, p in prices.items()])
+    db.session.execute(User.__table__.insert(), [
+        {'id': i, 'username': 'user{}'.format(i), 'email': 'user{}@example.com'.format(i),
+         'cash': 500.0} for i in range(1, USERS + 1)])
+    holdings = {}
+    for user_id in range(1, USERS + 1):
+        for team in random.sample(list(prices), 5):
+            holdings[(user_id, team)] = {'user_id': user_id, 'stock': team,
+                                         'shares': random.randint(1, 20),
+                                         'purchase_price': prices[team]}
+    db.session.execute(Holding.__table__.insert(), list(holdings.values()))
+    start = datetime.utcnow() - timedelta(days=7)
+    orders = []
+    for i in range(ORDERS):
+        # Buys rest below the current price and sells above it
+        if random.random() < 0.5:
+            user_id, team = random.choice(list(holdings))
+            side, limit = 'sell', prices[team] * random.uniform(1.0, 1.2)
+        else:
+            user_id, team = random.randint(1, USERS), random.choice(list(prices))
+            side, limit = 'buy', prices[team] * random.uniform(0.8, 1.0)
+        orders.append({'user_id': user_id, 'team': team, 'shares': random.randint(1, 3),
+                       'limit_price': round(limit, 2), 'buy_or_sell': side,
+                       'status': 'open', 'timestamp': start + timedelta(seconds=i)})
+    db.session.execute(LimitOrder.__table__.insert(), orders)
+    # The nightly update moves every price by up to 10% either way
+    stocks = Stock.__table__
+    db.session.execute(stocks.update().where(stocks.c.name == bindparam('b_name')), [
+        {'b_name': n, 'price': round(p * random.uniform(0.9, 1.1), 2)}
+        for n, p in prices.items()])
+    db.session.commit()
+
+def main():
+    args = parser.parse_args()
+    with app.app_context():
+        seed()
+        start = time.perf_counter()
+        books = load_books()
+        loaded = time.perf_counter() - start
+        start = time.perf_counter()
+        filled, rejected = match_orders()
+        elapsed = time.perf_counter() - start
+        print('{:,d} open orders in {} books loaded in {:.3f}s'.format(
+            sum(len(b) for b in books.values()), len(books), loaded))
+        print('Matching pass: {:,d} filled, {:,d} rejected in {:.3f}s'.format(
+            filled, rejected, elapsed))
+    if elapsed > args.max_seconds:
+        print('FAIL the matching pass took over {}s'.format(args.max_seconds))
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+"""Price series for a comparison chart: N team pages versus one API call.
+
+Seeds a database, then fetches the price history of --teams teams the old
+way, one /team/<teamname> page (with its server-rendered chart) each, and
+the new way, one /api/prices request, each with the caches cold and warm.
+It also fetches every team's series at once. Reports the bytes sent, the
+SQL statements run and the time taken.
+
+Run from the project root with: python -m benchmarks.bench_price_series
+"""
+import argparse
+import os
+import tempfile
+import time
+
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench.db')
+
+from sqlalchemy import event
+from app import create_app, db
+from app.models import User, Stock
+from benchmarks.seed import seed
+
+app = create_app()
+
+parser = argparse.ArgumentParser(description='Benchmark multi-team price series.')
+parser.add_argument('--teams', type=int, default=10, help='Teams to compare')
+parser.add_argument('--days', type=int, default=150)
+
+def fetch(client, urls):
+    """Bytes, queries and milliseconds to GET every url."""
+    queries = [0]
+    def count(*args):
+        queries[0] += 1
+    engines = list(filter(None, [db.get_engine(app), db.read_engine(app)]))
+    for engine in engines:
+        event.listen(engine, 'before_cursor_execute', count)
+    size = 0
+    start = time.perf_counter()
+    try:
+        for url in urls:
+            response = client.get(url)
+            if response.status_code != 200:
+                raise RuntimeError('{} returned {}'.format(url, response.status_code))
+            size += len(response.data)
+    finally:
+        for engine in engines:
+            event.remove(engine, 'before_cursor_execute', count)
+    return size, queries[0], (time.perf_counter() - start) * 1000
+
+def main():
+    args = parser.parse_args()
+    with app.app_context():
+        seed(users=200, teams=350, transactions=2000, days=args.days)
+        user_id = db.session.query(User.id).first()[0]
+        teams = [s for s, in db.session.query(Stock.name).order_by(Stock.name).limit(args.teams)]
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = str(user_id)
+    runs = [
+        ('{} team pages'.format(len(teams)), ['/team/' + t for t in teams]),
+        ('/api/prices, {} teams'.format(len(teams)), ['/api/prices?teams=' + ','.join(teams)]),
+        ('/api/prices, all teams', ['/api/prices']),
+    ]
+    print('{:<26} {:>6} {:>11} {:>8} {:>10}'.format('', 'cache', 'bytes', 'queries', 'time'))
+    for label, urls in runs:
+        # Cold: as after a new price snapshot
+        app.extensions['chart_cache'].clear()
+        app.jinja_env.fragment_cache.clear()
+        for cache in ['cold', 'warm']:
+            size, queries, elapsed = fetch(client, urls)
+            print('{:<26} {:>6} {:>11,d} {:>8,d} {:>8.1f}ms'.format(
+                label, cache, size, queries, elapsed))
+
+if __name__ == '__main__':
+    main()
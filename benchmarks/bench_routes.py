@@ -0,0 +1,154 @@
+"""Latency and SQL query counts for the main pages.
+
+Drives each route through the Flask test client as a logged in user and
+reports latency percentiles and queries per request. Results are compared
+with benchmarks/baseline.json: a route regresses if it runs more queries
+than its baseline, and the run then exits non-zero. Latencies depend on
+the machine, so the committed baseline only holds query counts; save one
+of your own with --save-baseline and pass --check-latency to also fail a
+route whose p90 latency grows past the tolerance.
+
+Uses the database given with --database, whose name must start with
+"bench" (see benchmarks/seed.py), or seeds a small temporary one. It buys
+shares in it: the market is treated as open so trades go through.
+
+Run from the project root with: python -m benchmarks.bench_routes
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import OrderedDict
+
+from sqlalchemy import event
+from app import create_app, db
+from app.models import User, Stock
+from app.main import forms
+from benchmarks.seed import bench_config, seed
+
+BASELINE = os.path.join(os.path.dirname(__file__), 'baseline.json')
+WARMUP = 5
+
+parser = argparse.ArgumentParser(description='Benchmark the main pages.')
+parser.add_argument('--database',
+                    help='A seeded benchmark database URL (default: seed a temporary one)')
+parser.add_argument('--requests', type=int, default=200, help='Requests per route')
+parser.add_argument('--check-latency', action='store_true',
+                    help='Also fail on p90 latency growth; needs a baseline saved on this machine')
+parser.add_argument('--tolerance', type=float, default=1.5,
+                    help='Allowed p90 latency growth over the baseline')
+parser.add_argument('--baseline', default=BASELINE)
+parser.add_argument('--save-baseline', action='store_true')
+
+def routes(usernames, teams):
+    """(name, method, url function, form data function) for each benchmark."""
+    return [
+        ('user', 'GET', lambda: '/user/' + random.choice(usernames), None),
+        ('leaders', 'GET', lambda: '/leaders', None),
+        ('analytics', 'GET', lambda: '/analytics', None),
+        ('team', 'GET', lambda: '/team/' + random.choice(teams), None),
+        ('transaction', 'GET', lambda: '/transaction', None),
+        ('transaction (buy)', 'POST', lambda: '/transaction',
+         lambda: {'stock': random.choice(teams), 'shares': 1, 'buy_or_sell': 'buy'}),
+    ]
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(int(len(values) * p / 100), len(values) - 1)]
+
+def run(app, client, user_ids, method, url, data, n):
+    queries = [0]
+    def count(conn, cursor, statement, parameters, context, executemany):
+        queries[0] += 1
+    latencies, counts = [], []
+    engines = list(filter(None, [db.get_engine(app), db.read_engine(app)]))
+    for engine in engines:
+        event.listen(engine, 'before_cursor_execute', count)
+    try:
+        for i in range(WARMUP + n):
+            with client.session_transaction() as session:
+                session['_user_id'] = str(random.choice(user_ids))
+            path, form = url(), data() if data else None
+            queries[0] = 0
+            start = time.perf_counter()
+            response = client.open(path, method=method, data=form)
+            elapsed = time.perf_counter() - start
+            if response.status_code >= 400:
+                raise RuntimeError('{} {} returned {}'.format(method, path, response.status_code))
+            if i >= WARMUP:
+                latencies.append(elapsed * 1000)
+                counts.append(queries[0])
+    finally:
+        for engine in engines:
+            event.remove(engine, 'before_cursor_execute', count)
+    return OrderedDict([
+        ('p50', round(percentile(latencies, 50), 2)),
+        ('p90', round(percentile(latencies, 90), 2)),
+        ('p99', round(percentile(latencies, 99), 2)),
+        ('queries', max(counts)),
+    ])
+
+def compare(results, baseline, tolerance=None):
+    """Routes that run more queries than the baseline, or with a tolerance,
+    whose p90 latency grew past it."""
+    regressions = []
+    for name, result in results.items():
+        expected = baseline.get(name)
+        if expected is None:
+            continue
+        if result['queries'] > expected['queries']:
+            regressions.append('{}: {} queries, baseline {}'.format(
+                name, result['queries'], expected['queries']))
+        if tolerance is not None and 'p90' in expected and \
+                result['p90'] > expected['p90'] * tolerance:
+            regressions.append('{}: p90 {:.1f}ms, baseline {:.1f}ms'.format(
+                name, result['p90'], expected['p90']))
+    return regressions
+
+def main():
+    args = parser.parse_args()
+    database = args.database or 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench.db')
+    try:
+        app = create_app(bench_config(database))
+    except ValueError as e:
+        parser.error(str(e))
+    app.config['WTF_CSRF_ENABLED'] = False
+    forms.market_is_open = lambda: True
+    random.seed(1)
+    with app.app_context():
+        if not args.database:
+            seed(users=5000, teams=350, transactions=200000, days=150)
+        user_ids = [u for u, in db.session.query(User.id)]
+        usernames = [u for u, in db.session.query(User.username)]
+        teams = [s for s, in db.session.query(Stock.name)]
+    client = app.test_client()
+    results = OrderedDict()
+    print('{:<18} {:>9} {:>9} {:>9} {:>8}'.format('route', 'p50', 'p90', 'p99', 'queries'))
+    for name, method, url, data in routes(usernames, teams):
+        result = results[name] = run(app, client, user_ids, method, url, data, args.requests)
+        print('{:<18} {:>7.1f}ms {:>7.1f}ms {:>7.1f}ms {:>8d}'.format(
+            name, result['p50'], result['p90'], result['p99'], result['queries']))
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(results, f, indent=2)
+        print('Saved baseline to {}'.format(args.baseline))
+        return
+    if not os.path.exists(args.baseline):
+        print('No baseline at {}; run with --save-baseline to make one.'.format(args.baseline))
+        return
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    if args.check_latency and not any('p90' in b for b in baseline.values()):
+        print('{} has no latencies; save a baseline on this machine first.'.format(args.baseline))
+    regressions = compare(results, baseline, args.tolerance if args.check_latency else None)
+    for regression in regressions:
+        print('REGRESSION ' + regression)
+    if regressions:
+        sys.exit(1)
+    print('No regressions against {}'.format(args.baseline))
+
+if __name__ == '__main__':
+    main()
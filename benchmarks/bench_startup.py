@@ -0,0 +1,90 @@
+"""How long a fresh process takes to import, build and serve the app.
+
+Each run is a new interpreter, as a gunicorn worker is when it boots or is
+recycled: it imports the app package, calls create_app() and serves its
+first request, and reports which of the heavy libraries (pygal, pandas,
+numpy) got imported along the way. Then, in one process, it builds
+--apps isolated testing apps with in-memory databases, as a test suite
+would.
+
+Run from the project root with: python -m benchmarks.bench_startup
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+HEAVY = ('pygal', 'pandas', 'numpy')
+
+WORKER = '''
+import json, sys, time
+start = time.perf_counter()
+from app import create_app
+imported = time.perf_counter()
+app = create_app()
+created = time.perf_counter()
+app.test_client().get('/index')
+served = time.perf_counter()
+print(json.dumps({'import': imported - start, 'create_app': created - imported,
+                  'first request': served - created,
+                  'heavy': [m for m in sys.argv[1:] if m in sys.modules]}))
+'''
+
+TESTS = '''
+import json, sys, time
+from config import Config
+from app import create_app, db
+
+class TestConfig(Config):
+    TESTING = True
+    SQLALCHEMY_DATABASE_URI = 'sqlite://'
+    SQLALCHEMY_BINDS = {}
+
+times = []
+for _ in range(int(sys.argv[1])):
+    start = time.perf_counter()
+    app = create_app(TestConfig)
+    with app.app_context():
+        db.create_all()
+    times.append(time.perf_counter() - start)
+print(json.dumps(times))
+'''
+
+parser = argparse.ArgumentParser(description='Benchmark app startup.')
+parser.add_argument('--repeat', type=int, default=5, help='Fresh worker processes to time')
+parser.add_argument('--apps', type=int, default=50, help='Testing apps to build in one process')
+
+def median(values):
+    values = sorted(values)
+    return values[len(values) // 2]
+
+def run(code, *args):
+    # From an empty directory, so the logs/ a production app makes land there
+    env = dict(os.environ, DATABASE_URL='sqlite://',
+               PYTHONPATH=os.pathsep.join(filter(None, [os.getcwd(),
+                                                        os.environ.get('PYTHONPATH')])))
+    start = time.perf_counter()
+    output = subprocess.check_output([sys.executable, '-c', code] + list(args),
+                                     cwd=tempfile.mkdtemp(), env=env,
+                                     stderr=subprocess.DEVNULL)
+    return time.perf_counter() - start, json.loads(output.decode().strip().splitlines()[-1])
+
+def main():
+    args = parser.parse_args()
+    runs = [run(WORKER, *HEAVY) for _ in range(args.repeat)]
+    print('Fresh worker, median of {}:'.format(args.repeat))
+    for stage in ['import', 'create_app', 'first request']:
+        print('  {:<14} {:7.1f}ms'.format(stage, 1000 * median([r[stage] for _, r in runs])))
+    print('  {:<14} {:7.1f}ms (interpreter start to exit)'.format(
+        'process', 1000 * median([wall for wall, _ in runs])))
+    heavy = runs[-1][1]['heavy']
+    print('  heavy modules loaded: {}'.format(', '.join(heavy) if heavy else 'none'))
+    _, times = run(TESTS, str(args.apps))
+    print('{} testing apps with in-memory databases: first {:.1f}ms, then median {:.1f}ms each'.format(
+        args.apps, 1000 * times[0], 1000 * median(times[1:] or times)))
+
+if __name__ == '__main__':
+    main()
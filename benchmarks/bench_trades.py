@@ -0,0 +1,94 @@
+"""Concurrent trade stress test.
+
+Many threads trade for the same few users at once, then the ledger is
+checked: no negative cash or shares, and every user's cash and holdings
+match what their recorded transactions add up to.
+
+Run from the project root with: python -m benchmarks.bench_trades
+"""
+import os
+import random
+import tempfile
+import threading
+import time
+from collections import defaultdict
+
+db_dir = tempfile.mkdtemp()
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(db_dir, 'bench.db')
+
+from app import create_app, db
+from app.models import User, Holding, Stock, Transaction
+from app.replay import STARTING_CASH
+from app.trading import execute_trade, TradeError
+
+app = create_app()
+
+THREADS = 8
+TRADES_PER_THREAD = 250
+USERS = 3
+STOCKS = 5
+
+def seed():
+    db.create_all()
+    for i in range(STOCKS):
+        db.session.add(Stock(name='Team {}'.format(i), price=round(random.uniform(1, 20), 2)))
+    for i in range(USERS):
+        db.session.add(User(username='trader{}'.format(i), email='trader{}@example.com'.format(i),
+                            cash=STARTING_CASH))
+    db.session.commit()
+
+def trader(results):
+    with app.app_context():
+        done = 0
+        rejected = defaultdict(int)
+        for _ in range(TRADES_PER_THREAD):
+            try:
+                execute_trade(random.randint(1, USERS),
+                              'Team {}'.format(random.randrange(STOCKS)),
+                              random.randint(1, 10), random.choice(['buy', 'buy', 'sell']))
+                done += 1
+            except TradeError as e:
+                rejected[str(e)] += 1
+        results.append((done, rejected))
+
+def check():
+    cash = defaultdict(lambda: STARTING_CASH)
+    shares = defaultdict(int)
+    for t in Transaction.query.order_by(Transaction.id):
+        sign = 1 if t.buy_or_sell == 'buy' else -1
+        cash[t.user_id] = round(cash[t.user_id] - sign * round(t.shares * t.price, 2), 2)
+        shares[(t.user_id, t.team)] += sign * t.shares
+    for user in User.query.all():
+        assert user.cash >= 0, user
+        assert abs(user.cash - cash[user.id]) < 0.005, (user, user.cash, cash[user.id])
+    held = dict(((h.user_id, h.stock), h.shares) for h in Holding.query.all())
+    for key, count in shares.items():
+        assert count >= 0, key
+        assert held.get(key, 0) == count, (key, held.get(key), count)
+
+def main():
+    with app.app_context():
+        seed()
+    results = []
+    threads = [threading.Thread(target=trader, args=(results,)) for _ in range(THREADS)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+    done = sum(r[0] for r in results)
+    rejected = defaultdict(int)
+    for _, reasons in results:
+        for reason, count in reasons.items():
+            rejected[reason] += count
+    with app.app_context():
+        check()
+    print('{} threads: {} trades, {} rejected in {:.2f}s ({:.0f} trades/sec)'.format(
+        THREADS, done, sum(rejected.values()), elapsed, done / elapsed))
+    for reason, count in sorted(rejected.items()):
+        print('  {:>5}  {}'.format(count, reason))
+    print('Invariants hold.')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+"""SQL queries and latency of /user/<username> as holdings grow.
+
+Seeds users holding 1 to 50 teams and requests each one's page as a
+logged in user. The portfolio is read in one query, so every page should
+run the same number of queries; the run exits non-zero if they differ.
+
+Run from the project root with: python -m benchmarks.bench_user_page
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench.db')
+
+from sqlalchemy import event
+from app import create_app, db
+from app.models import User, Holding, Stock, Transaction
+from app.replay import STARTING_CASH
+
+app = create_app()
+
+parser = argparse.ArgumentParser(description='Benchmark the user page as holdings grow.')
+parser.add_argument('--holdings', type=int, nargs='+', default=[1, 5, 20, 50])
+parser.add_argument('--requests', type=int, default=20, help='Requests per page')
+
+def seed(sizes):
+    db.create_all()
+    teams = ['Team {}'.format(i) for i in range(max(sizes))]
+    db.session.add_all([Stock(name=t, price=round(random.uniform(1, 20), 2)) for t in teams])
+    db.session.add(User(username='viewer', email='viewer@example.com', cash=STARTING_CASH))
+    for n in sizes:
+        user = User(username='holder{}'.format(n), email='holder{}@example.com'.format(n),
+                    cash=STARTING_CASH)
+        db.session.add(user)
+        db.session.flush()
+        for team in teams[:n]:
+            price = round(random.uniform(1, 20), 2)
+            db.session.add(Holding(user_id=user.id, stock=team, shares=2, purchase_price=price))
+            db.session.add(Transaction(user_id=user.id, team=team, shares=2, price=price,
+                                       buy_or_sell='buy'))
+    db.session.commit()
+
+def measure(client, url, n):
+    """Queries per request (the most any request ran) and median milliseconds."""
+    queries = [0]
+    def count(*args):
+        queries[0] += 1
+    engines = list(filter(None, [db.get_engine(app), db.read_engine(app)]))
+    for engine in engines:
+        event.listen(engine, 'before_cursor_execute', count)
+    counts, times = [], []
+    try:
+        for _ in range(n):
+            queries[0] = 0
+            start = time.perf_counter()
+            response = client.get(url)
+            times.append((time.perf_counter() - start) * 1000)
+            if response.status_code != 200:
+                raise RuntimeError('{} returned {}'.format(url, response.status_code))
+            counts.append(queries[0])
+    finally:
+        for engine in engines:
+            event.remove(engine, 'before_cursor_execute', count)
+    return max(counts), sorted(times)[n // 2]
+
+def main():
+    args = parser.parse_args()
+    random.seed(1)
+    with app.app_context():
+        seed(args.holdings)
+        viewer = User.query.filter_by(username='viewer').one().id
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = str(viewer)
+    # The first request loads the leaderboard and stock catalog
+    client.get('/user/viewer')
+    results = {}
+    print('{:>9} {:>8} {:>9}'.format('holdings', 'queries', 'p50'))
+    for n in args.holdings:
+        queries, p50 = results[n] = measure(client, '/user/holder{}'.format(n), args.requests)
+        print('{:>9d} {:>8d} {:>7.1f}ms'.format(n, queries, p50))
+    if len(set(queries for queries, _ in results.values())) > 1:
+        print('FAIL the query count grows with holdings')
+        sys.exit(1)
+    print('Same number of queries for every portfolio size')
+
+if __name__ == '__main__':
+    main()
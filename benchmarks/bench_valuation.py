@@ -0,0 +1,61 @@
+"""Whole-market valuation: the NumPy engine against per-user SQL.
+
+Seeds a database, values every portfolio with Market.load().value() and
+with the leaderboard's aggregate query (portfolio_values), and times both.
+The run exits non-zero if any user's value differs by more than a cent.
+
+Run from the project root with: python -m benchmarks.bench_valuation
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench.db')
+
+from app import create_app, db
+from app.leaderboard import portfolio_values
+from app.models import User
+from app.valuation import Market
+from benchmarks.seed import seed
+
+app = create_app()
+
+# Keeps the IN lists under SQLite's bound parameter limit
+CHUNK = 500
+
+parser = argparse.ArgumentParser(description='Check and time the valuation engine.')
+parser.add_argument('--users', type=int, default=5000)
+parser.add_argument('--transactions', type=int, default=100000)
+
+def main():
+    args = parser.parse_args()
+    with app.app_context():
+        seed(users=args.users, teams=350, transactions=args.transactions, days=30)
+        user_ids = [u for u, in db.session.query(User.id).order_by(User.id)]
+
+        start = time.perf_counter()
+        engine = dict((u, value) for u, _, value in Market.load().value().rows())
+        engine_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        expected = {}
+        for i in range(0, len(user_ids), CHUNK):
+            expected.update((u, value) for u, _, value
+                            in portfolio_values(user_ids[i:i + CHUNK]))
+        sql_time = time.perf_counter() - start
+
+    mismatches = [(u, engine.get(u), value) for u, value in sorted(expected.items())
+                  if engine.get(u) is None or abs(engine[u] - value) > 0.01]
+    print('{:,d} portfolios: engine {:.1f}ms, SQL {:.1f}ms'.format(
+        len(expected), engine_time * 1000, sql_time * 1000))
+    for user_id, got, value in mismatches[:10]:
+        print('MISMATCH user {}: engine {}, SQL {}'.format(user_id, got, value))
+    if mismatches or len(engine) != len(expected):
+        print('FAIL {} of {} portfolios differ'.format(len(mismatches), len(expected)))
+        sys.exit(1)
+    print('Every portfolio matches to the cent')
+
+if __name__ == '__main__':
+    main()
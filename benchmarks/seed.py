@@ -0,0 +1,173 @@
+"""Build a synthetic exchange database for benchmarking.
+
+Prices follow a random walk per team. Trades are generated in time order
+with a few very active users; buys are sized to what the user can afford
+and sells come out of teams the user holds. Holdings, cash and the
+analytics rollups are derived from the trades, so the data is consistent.
+
+Run from the project root with, for example:
+
+    python -m benchmarks.seed --database sqlite:///bench.db \\
+        --users 50000 --teams 350 --transactions 2000000 --days 150
+
+Seeding drops every table first, so it refuses any database whose name
+doesn't start with "bench" (bench.db, bench_exchange and so on). The
+database defaults to bench.db in the project root; DATABASE_URL is
+ignored, so an exported one is never seeded by accident.
+"""
+import argparse
+import os
+import random
+import time
+from datetime import date, datetime, timedelta
+
+from sqlalchemy.engine.url import make_url
+from werkzeug.security import generate_password_hash
+from config import Config
+from app import create_app, db
+from app.models import User, Holding, Stock, StockPriceHistory, Transaction, DataVersion
+from app.replay import STARTING_CASH
+
+basedir = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+
+CHUNK = 50000
+PASSWORD = 'password'
+DEFAULT_DATABASE = 'sqlite:///' + os.path.join(basedir, 'bench.db')
+
+def check_database(url):
+    """Raise ValueError unless `url` names a benchmark database.
+
+    Benchmark databases are in memory or named bench*, so a seed or a
+    benchmark that trades never touches a real one.
+    """
+    url = make_url(str(url))
+    name = os.path.basename(url.database or '')
+    if url.database in (None, '', ':memory:') or name.startswith('bench'):
+        return
+    raise ValueError('{} is not a benchmark database: its name must start '
+                     'with "bench"'.format(url))
+
+def bench_config(url):
+    """A config class for an app on the benchmark database at `url`."""
+    check_database(url)
+    return type('BenchConfig', (Config,), {
+        'SQLALCHEMY_DATABASE_URI': url,
+        'SQLALCHEMY_BINDS': {'read': url},
+    })
+
+def _insert(table, rows):
+    for i in range(0, len(rows), CHUNK):
+        db.session.execute(table.insert(), rows[i:i + CHUNK])
+
+def username(i):
+    return 'user{}'.format(i)
+
+def team_name(i):
+    return 'Team {}'.format(i)
+
+def seed(users=50000, teams=350, transactions=2000000, days=150, rng=None):
+    """Fill an empty database; returns how many trades were made."""
+    rng = rng or random.Random(1)
+    check_database(db.engine.url)
+    db.drop_all()
+    db.create_all()
+    start = date.today() - timedelta(days=days - 1)
+    names = [team_name(i) for i in range(teams)]
+
+    prices = []
+    price = [rng.uniform(1, 30) for _ in names]
+    for d in range(days):
+        price = [max(0.1, p + rng.gauss(0, 0.5)) for p in price]
+        prices.append([round(p, 2) for p in price])
+    _insert(Stock.__table__, [{'name': n, 'price': p} for n, p in zip(names, prices[-1])])
+    _insert(StockPriceHistory.__table__, [
+        {'name': n, 'date': start + timedelta(days=d), 'price': prices[d][i]}
+        for d in range(days) for i, n in enumerate(names)])
+
+    # One hash for everyone; hashing 50k passwords would dominate the run
+    password_hash = generate_password_hash(PASSWORD)
+    cash = [STARTING_CASH] * (users + 1)
+    positions = {}
+    trades = []
+    span = days * 86400.0
+    first = datetime.combine(start, datetime.min.time())
+    for t in range(transactions):
+        # Pareto weights give a few users thousands of trades
+        user = min(int(rng.paretovariate(1.2)), users) if rng.random() < 0.3 \
+            else rng.randint(1, users)
+        seconds = span * t / transactions
+        day = int(seconds // 86400)
+        held = positions.setdefault(user, {})
+        team = rng.randrange(teams)
+        shares = min(rng.randint(1, 20), int(cash[user] // prices[day][team]))
+        if held and (shares <= 0 or rng.random() < 0.4):
+            # Sell some of a team the user holds
+            team = rng.choice(list(held))
+            price = prices[day][team]
+            position = held[team]
+            shares = rng.randint(1, position[0])
+            position[0] -= shares
+            if not position[0]:
+                del held[team]
+            cash[user] = round(cash[user] + shares * price, 2)
+            buy_or_sell = 'sell'
+        elif shares > 0:
+            price = prices[day][team]
+            position = held.get(team)
+            if position:
+                total = position[0] + shares
+                position[1] = round((position[0] * position[1] + shares * price) / total, 2)
+                position[0] = total
+            else:
+                held[team] = [shares, price]
+            cash[user] = round(cash[user] - shares * price, 2)
+            buy_or_sell = 'buy'
+        else:
+            continue
+        trades.append({'timestamp': first + timedelta(seconds=seconds), 'user_id': user,
+                       'team': names[team], 'shares': shares, 'price': price,
+                       'buy_or_sell': buy_or_sell})
+
+    _insert(User.__table__, [
+        {'id': i, 'username': username(i), 'email': '{}@example.com'.format(username(i)),
+         'password_hash': password_hash, 'cash': cash[i], 'last_seen': first}
+        for i in range(1, users + 1)])
+    _insert(Holding.__table__, [
+        {'user_id': user, 'stock': names[team], 'shares': shares, 'purchase_price': cost}
+        for user, held in positions.items()
+        for team, (shares, cost) in held.items()])
+    _insert(Transaction.__table__, trades)
+    _insert(DataVersion.__table__, [{'name': 'prices', 'version': 1}])
+    db.session.commit()
+
+    from app.analytics import rebuild
+    rebuild()
+    return len(trades)
+
+parser = argparse.ArgumentParser(description='Build a synthetic exchange database.')
+parser.add_argument('--database', default=DEFAULT_DATABASE,
+                    help='Database URL; its name must start with "bench" (default bench.db)')
+parser.add_argument('--users', type=int, default=50000)
+parser.add_argument('--teams', type=int, default=350)
+parser.add_argument('--transactions', type=int, default=2000000,
+                    help='Trades to generate; a user with no cash or shares skips a turn')
+parser.add_argument('--days', type=int, default=150)
+parser.add_argument('--seed', type=int, default=1)
+
+def main():
+    args = parser.parse_args()
+    try:
+        config = bench_config(args.database)
+    except ValueError as e:
+        parser.error(str(e))
+    started = time.perf_counter()
+    app = create_app(config)
+    with app.app_context():
+        kept = seed(args.users, args.teams, args.transactions, args.days,
+                    random.Random(args.seed))
+    print('Seeded {} with {:,d} users, {:,d} teams, {:,d} trades and {} days in {:.1f}s'.format(
+        args.database, args.users, args.teams, kept, args.days,
+        time.perf_counter() - started))
+
+if __name__ == '__main__':
+    main()
@@ -9,9 +9,37 @@ class Config(object):
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or \
         'sqlite:///' + os.path.join(basedir, 'app.db')
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    # Read-only views query the 'read' bind: a replica, or the same database
+    SQLALCHEMY_BINDS = {
+        'read': os.environ.get('READ_DATABASE_URL') or SQLALCHEMY_DATABASE_URI,
+    }
+    SQLALCHEMY_POOL_SIZE = int(os.environ.get('DATABASE_POOL_SIZE') or 5)
+    SQLALCHEMY_MAX_OVERFLOW = int(os.environ.get('DATABASE_MAX_OVERFLOW') or 10)
+    SQLALCHEMY_POOL_TIMEOUT = int(os.environ.get('DATABASE_POOL_TIMEOUT') or 10)
+    SQLALCHEMY_POOL_RECYCLE = int(os.environ.get('DATABASE_POOL_RECYCLE') or 1800)
+    SQLITE_JOURNAL_MODE = os.environ.get('SQLITE_JOURNAL_MODE') or 'WAL'
+    SQLITE_BUSY_TIMEOUT = int(os.environ.get('SQLITE_BUSY_TIMEOUT') or 5000)
+    SQLITE_SYNCHRONOUS = os.environ.get('SQLITE_SYNCHRONOUS') or 'NORMAL'
+    SQLITE_CACHE_SIZE = int(os.environ.get('SQLITE_CACHE_SIZE') or 20000)
     MAIL_SERVER = os.environ.get('MAIL_SERVER')
     MAIL_PORT = int(os.environ.get('MAIL_PORT') or 25)
     MAIL_USE_TLS = os.environ.get('MAIL_USE_TLS') is not None
     MAIL_USERNAME = os.environ.get('MAIL_USERNAME')
     MAIL_PASSWORD = os.environ.get('MAIL_PASSWORD')
-    ADMINS = ['nycbuckets@gmail.com']
\ No newline at end of file
+    ADMINS = ['nycbuckets@gmail.com']
+    MAIL_WORKERS = int(os.environ.get('MAIL_WORKERS') or 2)
+    MAIL_BATCH_SIZE = int(os.environ.get('MAIL_BATCH_SIZE') or 50)
+    MAIL_QUEUE_SIZE = int(os.environ.get('MAIL_QUEUE_SIZE') or 1000)
+    MAIL_RETRIES = int(os.environ.get('MAIL_RETRIES') or 3)
+    MAIL_RETRY_BACKOFF = float(os.environ.get('MAIL_RETRY_BACKOFF') or 1.0)
+    MAIL_ANNOUNCE_TIMEOUT = float(os.environ.get('MAIL_ANNOUNCE_TIMEOUT') or 60)
+    MAX_BATCH_ORDERS = 100
+    TRANSACTIONS_PER_PAGE = 25
+    LAST_SEEN_FLUSH_INTERVAL = int(os.environ.get('LAST_SEEN_FLUSH_INTERVAL') or 60)
+    LAST_SEEN_MAX_PENDING = int(os.environ.get('LAST_SEEN_MAX_PENDING') or 100)
+    SLOW_QUERY_THRESHOLD = float(os.environ.get('SLOW_QUERY_THRESHOLD') or 0.1)
+    CHART_CACHE_SIZE = int(os.environ.get('CHART_CACHE_SIZE') or 128)
+    EVENTS_POLL_INTERVAL = float(os.environ.get('EVENTS_POLL_INTERVAL') or 1.0)
+    EVENTS_QUEUE_SIZE = int(os.environ.get('EVENTS_QUEUE_SIZE') or 100)
+    EVENTS_KEEPALIVE = float(os.environ.get('EVENTS_KEEPALIVE') or 15.0)
+    FRAGMENT_CACHE_SIZE = int(os.environ.get('FRAGMENT_CACHE_SIZE') or 256)
\ No newline at end of file
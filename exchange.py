@@ -1,6 +1,9 @@
-from app import app, db
+from app import create_app, db, cli
 from app.models import User, Holding
 
+app = create_app()
+cli.register(app)
+
 @app.shell_context_processor
 def make_shell_context():
     return {'db': db, 'User': User, 'Holding': Holding}
@@ -1,19 +1,48 @@
-import pandas as pd
+import argparse
 import os
+from datetime import datetime
+from app import create_app
+from app.export import EXPORT_DIR, LAYOUTS, FORMATS, export_name, export_prices
+from app.export import forget, wide, write_frame
+from app.prices import price_history, FREQUENCIES
 
-# Figure out where we are
-dirname = os.path.dirname(__file__)
-db_path = os.path.join(dirname, 'app.db')
+def parse_date(value):
+    return datetime.strptime(value, "%Y-%m-%d").date()
 
-# Read in the stock_price_history table
-data = pd.read_sql_table("stock_price_history", 'sqlite:///' + os.path.join(dirname, 'app.db'), index_col="id")
+parser = argparse.ArgumentParser(description="Export the stock price history.")
+parser.add_argument("--layout", choices=LAYOUTS, default="long",
+                    help="One row per price (long) or per team (wide)")
+parser.add_argument("--format", choices=FORMATS, default="csv",
+                    help="Parquet needs pyarrow installed")
+parser.add_argument("--freq", choices=FREQUENCIES, default="daily")
+parser.add_argument("--start", type=parse_date, help="First date (YYYY-MM-DD)")
+parser.add_argument("--end", type=parse_date, help="Last date (YYYY-MM-DD)")
+parser.add_argument("--full", action="store_true",
+                    help="Rewrite the export instead of adding new dates")
+parser.add_argument("--output", help="Defaults to the download in app/static")
 
-# Cleaning up the data
-data["price"] = data["price"].round(2)
+if __name__ == "__main__":
+    args = parser.parse_args()
+    if args.layout == "wide" and args.freq == "ohlc":
+        parser.error("OHLC prices can only be exported in the long layout")
+    output = args.output or os.path.join(EXPORT_DIR, export_name(args.layout, args.format))
 
-# Make the long data wide instead - Note: Not implemented
-# csv_data = data.pivot(index="name", columns="date", values="price")
-
-# Output to CSV
-csv_path = os.path.join(dirname, "app/static/stock_price_history.csv")
-data.to_csv(csv_path)
+    app = create_app()
+    with app.app_context():
+        if args.freq == "daily" and not (args.start or args.end):
+            # The full daily history is kept up to date incrementally
+            if args.full:
+                forget(output)
+            added = export_prices(output, args.layout)
+            print("Added {} prices to {}".format(added, output))
+        else:
+            # A one-off slice, written from scratch
+            import pandas as pd
+            rows = price_history(start=args.start, end=args.end, freq=args.freq)
+            data = pd.DataFrame(rows, columns=rows[0]._fields if rows else ["name", "date", "price"])
+            data = data.round(2)
+            if args.layout == "wide":
+                data = wide(data)
+            forget(output)
+            write_frame(output, data, index=args.layout == "wide")
+            print("Wrote {} prices to {}".format(len(rows), output))
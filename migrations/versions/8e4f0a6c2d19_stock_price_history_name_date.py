@@ -0,0 +1,44 @@
+"""stock price history name and date index
+
+Revision ID: 8e4f0a6c2d19
+Revises: 5b2d7e91c4a3
+Create Date: 2026-10-18 17:05:41.902113
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8e4f0a6c2d19'
+down_revision = '5b2d7e91c4a3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # stock_price_history predates the migrations, so create it on databases
+    # that were built from them alone
+    if 'stock_price_history' not in sa.inspect(op.get_bind()).get_table_names():
+        op.create_table('stock_price_history',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('name', sa.String(length=120), nullable=True),
+        sa.Column('date', sa.Date(), nullable=True),
+        sa.Column('price', sa.Float(), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+        )
+        op.create_index(op.f('ix_stock_price_history_date'), 'stock_price_history', ['date'], unique=False)
+    with op.batch_alter_table('stock_price_history') as batch_op:
+        batch_op.create_index('ix_stock_price_history_name_date', ['name', 'date'], unique=False)
+        batch_op.create_foreign_key('fk_stock_price_history_name_stock', 'stock', ['name'], ['name'])
+
+
+def downgrade():
+    with op.batch_alter_table('stock_price_history') as batch_op:
+        batch_op.drop_constraint('fk_stock_price_history_name_stock', type_='foreignkey')
+        batch_op.drop_index('ix_stock_price_history_name_date')
+    # upgrade() creates the table where it is missing. One that holds prices
+    # predates the migrations, so only an empty one is dropped
+    if not op.get_bind().execute(sa.text('SELECT count(*) FROM stock_price_history')).scalar():
+        op.drop_index(op.f('ix_stock_price_history_date'), table_name='stock_price_history')
+        op.drop_table('stock_price_history')
@@ -0,0 +1,116 @@
+import os
+import re
+import time
+from abc import ABC, abstractmethod
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+dirname = os.path.dirname(__file__)
+ARCHIVE_DIR = os.path.join(dirname, "price_csvs")
+
+def scrape_kenpom():
+    # pandas (and lxml under it) is slow to import, so only sources that
+    # parse a frame pay for it
+    import pandas as pd
+    url = "https://kenpom.com"
+    columns = [
+        "Rk", "Team", "Conf", "W-L",
+        "AdjEM", "AdjO", "AdjORnk", "AdjD", "AdjDRnk",
+        "AdjT", "AdjTRnk", "Luck", "LunkRnk",
+        "SOSAdjEM", "SOSAdjEMRnk", "OppO", "OppORnk",
+        "OppD", "OppDRnk", "NCSOSAdjEM", "NCSOSAdjEMRnk"
+    ]
+    kp_df = pd.read_html(url, header=[0, 1])[0]
+    kp_df.columns = columns
+    return kp_df
+
+def limit_and_calculate_prices(kp_df):
+    major_conf = ["ACC", "Amer", "B10", "B12", "BE", "P12", "SEC", "Conf"]
+    mid_majors = kp_df[
+        ~kp_df["Conf"].isin(major_conf) &
+        ~kp_df["AdjEM"].isnull()
+    ].copy()
+    mid_majors["AdjEM_num"] = mid_majors["AdjEM"]\
+        .apply(lambda x: float(x.replace("+", "")))
+    mid_majors["price"] = mid_majors["AdjEM_num"] + \
+                          abs(mid_majors["AdjEM_num"].min()) + \
+                          0.1
+    if not os.path.exists(ARCHIVE_DIR):
+        os.mkdir(ARCHIVE_DIR)
+    mid_majors.to_csv(os.path.join(ARCHIVE_DIR, "prices_{}".format(datetime.utcnow())), index=None)
+    return mid_majors
+
+def prices_from_frame(df):
+    return [(team, float(price)) for team, price in zip(df["Team"], df["price"])]
+
+_ARCHIVE_NAME = re.compile(r"prices_(\d{4}-\d{2}-\d{2})")
+
+def archive_date(path):
+    """The snapshot date in an archived file's name (prices_<utc timestamp>)."""
+    match = _ARCHIVE_NAME.search(os.path.basename(path))
+    if match is None:
+        raise ValueError("Not an archived price file: {}".format(path))
+    return match.group(1)
+
+def read_snapshot(path, date=None):
+    """An archived price file as a (date, [(team, price)]) snapshot."""
+    import pandas as pd
+    df = pd.read_csv(path, usecols=["Team", "price"])
+    return date or archive_date(path), prices_from_frame(df)
+
+class PriceSource(ABC):
+    """Somewhere price snapshots come from."""
+    @abstractmethod
+    def snapshots(self):
+        """An iterable of (date, [(team, price)]) pairs, oldest first, with
+        dates as YYYY-MM-DD strings."""
+
+class KenPomSource(PriceSource):
+    """Today's prices, scraped live and archived to price_csvs/."""
+    def __init__(self):
+        self.timings = {}
+
+    def snapshots(self):
+        stage_start = time.perf_counter()
+        kp_df = scrape_kenpom()
+        self.timings["scrape"] = time.perf_counter() - stage_start
+        stage_start = time.perf_counter()
+        mid_df = limit_and_calculate_prices(kp_df)
+        self.timings["prices"] = time.perf_counter() - stage_start
+        return [(datetime.utcnow().strftime("%Y-%m-%d"), prices_from_frame(mid_df))]
+
+class FileSource(PriceSource):
+    """One archived price file, dated by its name unless a date is given."""
+    def __init__(self, path, date=None):
+        self.path = path
+        self.date = date
+
+    def snapshots(self):
+        date, prices = read_snapshot(self.path, self.date)
+        return [(date, prices)]
+
+class DirectorySource(PriceSource):
+    """Every archived price file in a directory, replayed in time order.
+
+    Files are parsed in `workers` processes (default: one per CPU). The
+    first file of a day comes first, matching the live updater, which keeps
+    a day's first snapshot and skips later ones.
+    """
+    def __init__(self, path=ARCHIVE_DIR, workers=None):
+        self.path = path
+        self.workers = workers
+
+    def files(self):
+        names = [n for n in os.listdir(self.path) if _ARCHIVE_NAME.match(n)]
+        # The names embed the UTC timestamp, so they sort in time order
+        return [os.path.join(self.path, n) for n in sorted(names)]
+
+    def snapshots(self):
+        files = self.files()
+        if self.workers == 1:
+            return [read_snapshot(f) for f in files]
+        workers = self.workers or os.cpu_count() or 1
+        with ProcessPoolExecutor(workers) as pool:
+            # A few chunks per worker keeps the pickling overhead down
+            chunksize = max(1, len(files) // (4 * workers))
+            return list(pool.map(read_snapshot, files, chunksize=chunksize))
@@ -1,66 +1,178 @@
+import argparse
 import sqlite3
 import sys
 import os
-import pandas as pd
+import time
 from datetime import datetime
+from price_sources import KenPomSource, FileSource, DirectorySource, ARCHIVE_DIR
+from price_sources import prices_from_frame
+from config import Config
 
-def scrape_kenpom():
-    url = "https://kenpom.com"
-    columns = [
-        "Rk", "Team", "Conf", "W-L",
-        "AdjEM", "AdjO", "AdjORnk", "AdjD", "AdjDRnk",
-        "AdjT", "AdjTRnk", "Luck", "LunkRnk",
-        "SOSAdjEM", "SOSAdjEMRnk", "OppO", "OppORnk",
-        "OppD", "OppDRnk", "NCSOSAdjEM", "NCSOSAdjEMRnk"
-    ]
-    kp_df = pd.read_html(url, header=[0, 1])[0]
-    kp_df.columns = columns
-    return kp_df
+def database_path():
+    """The app's SQLite database: the file DATABASE_URL names, else app.db.
 
-def limit_and_calculate_prices(kp_df):
-    major_conf = ["ACC", "Amer", "B10", "B12", "BE", "P12", "SEC", "Conf"]
-    mid_majors = kp_df[
-        ~kp_df["Conf"].isin(major_conf) &
-        ~kp_df["AdjEM"].isnull()
-    ].copy()
-    mid_majors["AdjEM_num"] = mid_majors["AdjEM"]\
-        .apply(lambda x: float(x.replace("+", "")))
-    mid_majors["price"] = mid_majors["AdjEM_num"] + \
-                          abs(mid_majors["AdjEM_num"].min()) + \
-                          0.1
-    dirname = os.path.dirname(__file__)
-    mid_majors.to_csv(os.path.join(dirname, "price_csvs/prices_{}".format(datetime.utcnow())), index=None)
-    return mid_majors
-    
-def insert_data(df):
-    dirname = os.path.dirname(__file__)
-    conn = sqlite3.connect(os.path.join(dirname, 'app.db'))
+    Exits if DATABASE_URL names any other database, rather than loading
+    prices into an app.db the web app isn't reading.
+    """
+    url = os.environ.get("DATABASE_URL", "")
+    if not url:
+        return os.path.join(os.path.dirname(__file__), "app.db")
+    if url.startswith("sqlite:///"):
+        return url[len("sqlite:///"):]
+    # Only the scheme: the rest of the URL may hold a password
+    sys.exit("update_stocks.py only loads prices into a SQLite file, "
+             "but DATABASE_URL is a {}: URL".format(url.split(":", 1)[0]))
 
+def connect():
+    """A connection with the same journaling and busy timeout as the web app."""
+    conn = sqlite3.connect(database_path(), isolation_level=None,
+                           timeout=Config.SQLITE_BUSY_TIMEOUT / 1000.0)
+    conn.execute("PRAGMA journal_mode={}".format(Config.SQLITE_JOURNAL_MODE))
+    conn.execute("PRAGMA synchronous={}".format(Config.SQLITE_SYNCHRONOUS))
+    return conn
 
-    for i, r in df.iterrows():
-        # print(r["price"], r["name"])
-        sql = '''UPDATE stock
-                SET price = {}
-                WHERE name = "{}"
-            '''.format(r["price"], r["Team"])
-        # print(sql)
-        cur = conn.cursor()
-        cur.execute(sql)
-        
-        # This inserts the data into stock_price_history table
-        sph_sql = '''INSERT INTO stock_price_history(name, date, price) VALUES (?, ?, ?)'''
-        sph_vals = (r["Team"], datetime.utcnow().strftime("%Y-%m-%d"), r["price"])
-        cur = conn.cursor()
-        cur.execute(sph_sql, sph_vals)
+def insert_snapshots(snapshots):
+    """Load (date, [(team, price)]) snapshots, oldest first, in one write transaction.
 
-    select = '''SELECT * FROM stock WHERE name = "Abilene Christian"'''
-    cur = conn.cursor()
-    cur.execute(select)
-    print(cur.fetchall()[0])
-    conn.commit()
-    conn.close()
+    A team's price for a date is only loaded once: pairs already in the
+    database or earlier in the batch are skipped, so reloading is a no-op.
+    Current stock prices only move for dates at or after the newest one
+    already loaded, so backfilling old history leaves them alone. Returns
+    the dates loaded, how many prices were loaded and skipped, the date to
+    publish (if the newest date moved forward) and how long each stage took.
+    """
+    timings = {}
+    conn = connect()
+    try:
+        stage_start = time.perf_counter()
+        # Take the write lock up front so two runs can't both decide a
+        # (team, date) pair is missing
+        conn.execute("BEGIN IMMEDIATE")
+        latest = conn.execute("SELECT max(date) FROM stock_price_history").fetchone()[0]
+        dates = [date for date, _ in snapshots]
+        loaded = set()
+        if dates:
+            loaded = set(conn.execute(
+                "SELECT name, date FROM stock_price_history WHERE date BETWEEN ? AND ?",
+                (min(dates), max(dates))))
+        new_rows, current, total = [], {}, 0
+        for date, prices in snapshots:
+            for team, price in prices:
+                total += 1
+                if (team, date) in loaded:
+                    continue
+                loaded.add((team, date))
+                new_rows.append((team, date, price))
+                if latest is None or date >= latest:
+                    current[team] = price
+        timings["check"] = time.perf_counter() - stage_start
+
+        stage_start = time.perf_counter()
+        conn.executemany(
+            "UPDATE stock SET price = ? WHERE name = ?",
+            [(price, team) for team, price in current.items()])
+        conn.executemany(
+            "INSERT INTO stock_price_history(name, date, price) VALUES (?, ?, ?)",
+            new_rows)
+        if new_rows:
+            # Reprice the /analytics rollups at the new prices
+            conn.execute(
+                "UPDATE stock_rollup SET market_value = shares * "
+                "(SELECT price FROM stock WHERE stock.name = stock_rollup.stock)")
+            # Tells the web workers' stock catalogs and cached pages to reload
+            names = ["prices"] + sorted(set("price:" + team for team, _, _ in new_rows))
+            now = datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S.%f")
+            conn.executemany(
+                "INSERT OR IGNORE INTO data_version(name, version, updated_at) VALUES (?, 0, ?)",
+                [(name, now) for name in names])
+            conn.executemany(
+                "UPDATE data_version SET version = version + 1, updated_at = ? WHERE name = ?",
+                [(now, name) for name in names])
+        timings["write"] = time.perf_counter() - stage_start
+
+        stage_start = time.perf_counter()
+        conn.execute("COMMIT")
+        timings["commit"] = time.perf_counter() - stage_start
+    except Exception:
+        # Nothing to roll back if BEGIN itself failed (database locked)
+        if conn.in_transaction:
+            conn.execute("ROLLBACK")
+        raise
+    finally:
+        conn.close()
+    new_dates = sorted(set(date for _, date, _ in new_rows))
+    return {
+        "dates": new_dates,
+        "loaded": len(new_rows),
+        "skipped": total - len(new_rows),
+        "publish": new_dates[-1] if new_dates and (latest is None or new_dates[-1] >= latest) else None,
+        "timings": timings
+    }
+
+def insert_data(df, snapshot_date=None):
+    """Load one price snapshot, dated today unless a date is given."""
+    if snapshot_date is None:
+        snapshot_date = datetime.utcnow().strftime("%Y-%m-%d")
+    result = insert_snapshots([(snapshot_date, prices_from_frame(df))])
+    result["date"] = snapshot_date
+    return result
+
+def publish(snapshot_date):
+    """Let the web app react to newly loaded prices.
+
+    Limit orders and portfolio snapshots only move with the newest date, so
+    they're left alone when snapshot_date is None (only older history was
+    loaded); the exports pick up every new price either way.
+    """
+    from app import create_app
+    from app.export import refresh_exports
+    from app.orderbook import match_orders
+    from app.snapshots import write_snapshots
+    app = create_app()
+    with app.app_context():
+        if snapshot_date is not None:
+            filled, rejected = match_orders()
+            print("Limit orders: {} filled, {} rejected".format(filled, rejected))
+            write_snapshots(datetime.strptime(snapshot_date, "%Y-%m-%d").date())
+        for name, added in refresh_exports().items():
+            print("Export {}: {} new prices".format(name, added))
+
+def report(result, timings):
+    dates = result["dates"]
+    if len(dates) > 1:
+        label = "{} to {} ({} dates)".format(dates[0], dates[-1], len(dates))
+    else:
+        label = result.get("date") or (dates[0] if dates else "No new dates")
+    print("{}: loaded {} prices, skipped {} already loaded".format(
+        label, result["loaded"], result["skipped"]))
+    for stage, seconds in list(timings.items()) + list(result["timings"].items()):
+        print("  {:<10} {:8.3f}s".format(stage, seconds))
+
+parser = argparse.ArgumentParser(description="Load team prices into the exchange.")
+source_group = parser.add_mutually_exclusive_group()
+source_group.add_argument("--file", help="Load one archived price file instead of scraping")
+source_group.add_argument("--backfill", nargs="?", const=ARCHIVE_DIR, metavar="DIR",
+                          help="Load every archived price file in DIR (default price_csvs/)")
+parser.add_argument("--date", help="Date for --file (YYYY-MM-DD); defaults to the one in its name")
+parser.add_argument("--workers", type=int,
+                    help="Processes parsing files for --backfill (default: one per CPU)")
 
 if __name__ == "__main__":
-    kp_df = scrape_kenpom()
-    mid_df = limit_and_calculate_prices(kp_df)
-    insert_data(mid_df)
\ No newline at end of file
+    args = parser.parse_args()
+    if args.file:
+        source = FileSource(args.file, args.date)
+    elif args.backfill:
+        source = DirectorySource(args.backfill, args.workers)
+    else:
+        source = KenPomSource()
+    timings = {}
+    stage_start = time.perf_counter()
+    snapshots = list(source.snapshots())
+    timings["read"] = time.perf_counter() - stage_start
+    timings.update(getattr(source, "timings", {}))
+    result = insert_snapshots(snapshots)
+    if result["loaded"]:
+        stage_start = time.perf_counter()
+        publish(result["publish"])
+        timings["publish"] = time.perf_counter() - stage_start
+    report(result, timings)